@@ -9,6 +9,13 @@ import json
 from typing import Dict, List, Any, Callable, Coroutine, Optional
 from datetime import datetime
 
+# orjson serializes large event payloads several times faster than the
+# stdlib; fall back to json when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("utils.common")
@@ -96,6 +103,12 @@ def json_serializer(obj):
         return str(obj)
     raise TypeError(f"Type {type(obj)} not serializable")
 
+def dumps_details(details: Dict[str, Any]) -> str:
+    """Serialize an event details dict to a JSON string"""
+    if orjson is not None:
+        return orjson.dumps(details, default=json_serializer).decode("utf-8")
+    return json.dumps(details, default=json_serializer)
+
 async def record_system_event(
     database,
     event_type: str, 
@@ -118,8 +131,8 @@ async def record_system_event(
         # Convert details to JSON string if provided
         json_details = None
         if details:
-            json_details = json.dumps(details, default=json_serializer)
-        
+            json_details = dumps_details(details)
+
         query = """
             INSERT INTO system_events
             (event_type, status, started_at, details)
@@ -173,8 +186,8 @@ async def update_system_event(
         # Convert details to JSON string if provided
         json_details = None
         if details:
-            json_details = json.dumps(details, default=json_serializer)
-            
+            json_details = dumps_details(details)
+
         query = """
             UPDATE system_events
             SET 
@@ -1,24 +1,62 @@
-import yfinance as yf
 import asyncio
 import logging
-import pandas as pd
 from datetime import datetime
 import json
 
+# yfinance pulls in pandas, numpy and friends - defer the import until a
+# debug helper actually runs so --help and module import stay fast
+yf = None
+
+def _ensure_yf():
+    """Import yfinance on first use and bind it at module level"""
+    global yf
+    if yf is None:
+        import yfinance
+        yf = yfinance
+    return yf
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("yfinance_debug")
 
+# Reuse Ticker objects across calls - constructing one triggers network I/O,
+# so repeat debugging runs over the same symbols shouldn't pay it twice
+_ticker_cache = {}
+
+def _yf_ticker(symbol):
+    """Get a cached yf.Ticker for a symbol, creating it on first use"""
+    yf = _ensure_yf()
+    return _ticker_cache.setdefault(symbol, yf.Ticker(symbol))
+
+async def batch_download(tickers, period="1d"):
+    """
+    Download data for several tickers in one yf.download call.
+
+    yfinance fans the request out across its own worker pool (threads=True),
+    so N tickers cost ~N/threads serial HTTP calls instead of N. Runs in a
+    thread so the event loop isn't blocked.
+    """
+    yf = _ensure_yf()
+    return await asyncio.to_thread(
+        yf.download,
+        tickers=" ".join(tickers),
+        period=period,
+        group_by="ticker",
+        threads=True,
+        progress=False
+    )
+
 async def debug_price_update(ticker='AAPL'):
     try:
         logger.info(f"Debugging price update for ticker: {ticker}")
-        
+
         # Check library version
+        yf = _ensure_yf()
         logger.info(f"YFinance Version: {yf.__version__}")
         
         # Get current price (same approach as in yahoo_finance_client.py get_current_price method)
         logger.info("Fetching current price data...")
-        ticker_obj = yf.Ticker(ticker)
+        ticker_obj = _yf_ticker(ticker)
         
         # Get historical data for 1 day (same as in the client code)
         logger.info("Fetching 1-day history for current price...")
@@ -55,7 +93,7 @@ async def debug_price_update(ticker='AAPL'):
         batch_str = " ".join(batch)
         
         logger.info(f"Downloading batch data for: {batch_str}")
-        batch_data = yf.download(batch_str, period="1d", group_by="ticker")
+        batch_data = await batch_download(batch)
         
         logger.info("Raw batch data structure:")
         print(type(batch_data))
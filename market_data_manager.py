@@ -4,6 +4,7 @@ Market Data Manager to coordinate between different data sources.
 import os
 import logging
 import random
+import asyncio
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
@@ -375,6 +376,90 @@ class MarketDataManager:
         # If all sources fail, return None
         return None
     
+    async def get_batch_company_metrics(self, tickers: List[str], max_concurrent: int = 20) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Get company metrics for multiple tickers concurrently
+
+        Args:
+            tickers: List of ticker symbols
+            max_concurrent: Maximum number of in-flight metric lookups
+
+        Returns:
+            Dictionary mapping each ticker to its metrics (or None if all sources fail)
+        """
+        if not tickers:
+            return {}
+
+        # Metric endpoints are per-symbol on every source we have, so the
+        # batch is a bounded concurrent fan-out over get_company_metrics
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def fetch_one(ticker):
+            async with semaphore:
+                try:
+                    return ticker, await self.get_company_metrics(ticker)
+                except Exception as e:
+                    logger.warning(f"Error getting metrics for {ticker} in batch: {str(e)}")
+                    return ticker, None
+
+        fetched = await asyncio.gather(*(fetch_one(ticker) for ticker in tickers))
+        return dict(fetched)
+
+    async def get_batch_historical_prices(self, tickers: List[str], start_date: datetime, end_date: Optional[datetime] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get historical prices for multiple tickers using the best available sources
+
+        Args:
+            tickers: List of ticker symbols
+            start_date: Start date for historical data
+            end_date: End date for historical data (defaults to today)
+
+        Returns:
+            Dictionary mapping tickers to their historical price data
+        """
+        if not tickers:
+            return {}
+
+        results = {}
+        remaining_tickers = set(tickers)
+
+        sources_to_try = self._select_source_for_operation("historical_prices")
+
+        # Try sources that expose a true batch endpoint first
+        for source_name in sources_to_try:
+            source = self.sources.get(source_name)
+            if not source or not remaining_tickers:
+                continue
+            if not hasattr(source, "get_batch_historical_prices"):
+                continue
+
+            try:
+                batch_results = await source.get_batch_historical_prices(
+                    list(remaining_tickers), start_date, end_date
+                )
+
+                # Log API usage (count as one call for batch)
+                self._log_api_usage(source_name, success=len(batch_results) > 0)
+
+                for ticker, historical_data in batch_results.items():
+                    if historical_data:
+                        results[ticker] = historical_data
+                        remaining_tickers.discard(ticker)
+                        self._record_ticker_source_result(ticker, source_name, True)
+
+            except Exception as e:
+                logger.warning(f"Error in batch historical lookup from {source_name}: {str(e)}")
+                self._log_api_usage(source_name, False)
+
+        # For any remaining tickers, fall back to individual lookups
+        for ticker in list(remaining_tickers):
+            historical_data = await self.get_historical_prices(ticker, start_date, end_date)
+            if historical_data:
+                results[ticker] = historical_data
+                remaining_tickers.discard(ticker)
+
+        return results
+
     async def get_historical_prices(self, ticker: str, start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """
         Get historical prices for a ticker using the best available source
@@ -1,38 +1,183 @@
 """
 Polygon.io market data source implementation.
 """
+from __future__ import annotations
+
 import os
 import logging
 import asyncio
-import aiohttp
+import random
 from typing import List, Dict, Any, Optional
 import pytz
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from .data_source_interface import MarketDataSource
+from .common import RateLimiter
+from redis_cache import FastCache
+
+# aiohttp is imported on first session use; it is a heavy import that CLIs
+# which never hit the Polygon path shouldn't pay for at startup
+aiohttp = None
+
+def _ensure_aiohttp():
+    """Import aiohttp on first use and bind it at module level"""
+    global aiohttp
+    if aiohttp is None:
+        import aiohttp as _aiohttp
+        aiohttp = _aiohttp
+    return aiohttp
+
+# orjson decodes large aggregate responses several times faster than the
+# stdlib; fall back to the stdlib loader if it isn't installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("polygon_client")
 
+# HTTP statuses worth retrying - rate limits and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Cache TTLs - company metadata changes rarely, closed daily bars even less
+METRICS_CACHE_SECONDS = 7 * 24 * 3600
+HISTORY_CACHE_SECONDS = 24 * 3600
+
 class PolygonClient(MarketDataSource):
     """
     Client for interacting with Polygon.io API.
     """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, total_conn_limit: int = 100, per_host_limit: int = 20):
         """
         Initialize the Polygon client with API key
-        
+
         Args:
             api_key: Polygon API key (optional, will use environment variable if not provided)
+            total_conn_limit: Maximum simultaneous connections for the shared session
+            per_host_limit: Maximum simultaneous connections per host
         """
         self.api_key = api_key or os.getenv("POLYGON_API_KEY")
         if not self.api_key:
             raise ValueError("Polygon API key not provided and not found in environment")
-            
+
         self.base_url = "https://api.polygon.io"
-    
+
+        # Precomputed request building blocks shared by every call, so the
+        # hot paths don't rebuild identical URLs and param dicts per request
+        self._base_params = {"apiKey": self.api_key}
+        self._financials_params = {"apiKey": self.api_key, "limit": 1}  # just the most recent report
+        self._aggs_params = {"apiKey": self.api_key, "sort": "asc"}
+        self._last_trade_tmpl = f"{self.base_url}/v2/last/trade/{{ticker}}"
+        self._ticker_details_tmpl = f"{self.base_url}/v3/reference/tickers/{{ticker}}"
+        self._financials_tmpl = f"{self.base_url}/v2/reference/financials/{{ticker}}"
+        self._aggs_tmpl = f"{self.base_url}/v2/aggs/ticker/{{ticker}}/range/1/day/{{start_ms}}/{{end_ms}}"
+
+        # Dashboards poll the same ticker set repeatedly - keep the formatted
+        # last-trade URL per ticker so the hot path skips even the format call
+        self._price_urls: Dict[str, str] = {}
+
+        # Shared HTTP session, created lazily so it binds to the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._total_conn_limit = total_conn_limit
+        self._per_host_limit = per_host_limit
+
+        # Maximum number of in-flight requests for batch lookups
+        self._max_concurrency = 8
+
+        # Enforce the declared call limit instead of sprinkling sleeps.
+        # The free tier allows 5 requests per minute; paid tiers report no limit.
+        self._rate_limiter = RateLimiter(
+            requests_per_period=self.daily_call_limit or 100,
+            period_seconds=60
+        )
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared aiohttp session, creating it on first use.
+        Reusing one session keeps connections alive across calls instead of
+        paying a new TCP+TLS handshake per request.
+        """
+        if self._session is None or self._session.closed:
+            aiohttp = _ensure_aiohttp()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._total_conn_limit,
+                    limit_per_host=self._per_host_limit,
+                    ttl_dns_cache=300,
+                    enable_cleanup_closed=True
+                ),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+
+    async def _get_json(self, url: str, params: Dict[str, Any], retries: int = 3) -> tuple:
+        """
+        Issue a GET request and return (status, parsed JSON body).
+
+        Transient failures (429/5xx, connection errors, timeouts) are retried
+        with exponential backoff plus jitter; a Retry-After header from the
+        server takes precedence over the computed delay. Non-retryable
+        statuses are returned to the caller with a None body.
+        """
+        session = await self._get_session()
+        delay = 1.0
+
+        for attempt in range(retries + 1):
+            try:
+                await self._rate_limiter.wait_if_needed()
+                async with session.get(url, params=params) as response:
+                    if response.status in RETRYABLE_STATUSES and attempt < retries:
+                        retry_after = response.headers.get("Retry-After")
+                        if retry_after:
+                            wait_time = float(retry_after)
+                        else:
+                            wait_time = delay + random.uniform(0, delay)
+                        logger.warning(f"Got status {response.status} from Polygon, retrying in {wait_time:.1f}s (attempt {attempt + 1}/{retries + 1})")
+                        await asyncio.sleep(wait_time)
+                        delay = min(delay * 2, 30.0)
+                        continue
+
+                    if response.status >= 400:
+                        return response.status, None
+
+                    # Parse straight from the body bytes: response.json()
+                    # would decode the payload to an intermediate str first,
+                    # doubling peak memory on multi-year aggregate pulls, and
+                    # its content-type check chokes on Polygon's charset
+                    # variants besides
+                    body = await response.read()
+                    return response.status, json_loads(body)
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt < retries:
+                    wait_time = delay + random.uniform(0, delay)
+                    logger.warning(f"Connection error from Polygon: {str(e)}. Retrying in {wait_time:.1f}s (attempt {attempt + 1}/{retries + 1})")
+                    await asyncio.sleep(wait_time)
+                    delay = min(delay * 2, 30.0)
+                    continue
+                logger.error(f"Giving up on {url} after {retries + 1} attempts: {str(e)}")
+                raise
+
+        return None, None
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
     @property
     def source_name(self) -> str:
         """Return the name of this data source"""
@@ -54,53 +199,56 @@ class PolygonClient(MarketDataSource):
             Dictionary with price data or None if unavailable
         """
         try:
-            url = f"{self.base_url}/v2/last/trade/{ticker}"
-            params = {"apiKey": self.api_key}
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 403:
-                        logger.error(f"Authentication error with Polygon API for {ticker}: Check API key or subscription plan")
-                        # Mark this as a global issue, not ticker-specific
-                        self.api_auth_error = True
-                        return None
-                    
-                    if response.status == 404:
-                        logger.warning(f"Ticker {ticker} not found on Polygon")
-                        return {"not_found": True, "source": self.source_name}
-                        
-                    if response.status != 200:
-                        logger.warning(f"Failed to get price for {ticker}: Status {response.status}")
-                        return None
-                        
-                    data = await response.json()
-                    
-                    # Check if we have valid data
-                    if data.get("status") != "success" or "results" not in data:
-                        logger.warning(f"Invalid data for {ticker}: {data}")
-                        return None
-                        
-                    trade = data["results"]
-                    
-                    # Convert Unix timestamp (ms) to datetime in Eastern Time
-                    trade_time = datetime.fromtimestamp(trade["t"] / 1000)
-                    eastern = pytz.timezone('US/Eastern')
-                    price_time_et = eastern.localize(trade_time)
-                    
-                    # Format time string for display
-                    price_time_str = price_time_et.strftime("%Y-%m-%d %I:%M:%S %p %Z")
-                    
-                    return {
-                        "price": float(trade["p"]),  # price
-                        "timestamp": datetime.utcnow(),  # when we retrieved it
-                        "price_timestamp": price_time_et,  # when the price was recorded
-                        "price_timestamp_str": price_time_str,  # formatted string for display
-                        "volume": int(trade["s"]) if "s" in trade else None,  # size (volume)
-                        "source": self.source_name
-                    }
-            
-        except Exception as e:
-            logger.error(f"Error getting price for {ticker} from Polygon: {str(e)}")
+            url = self._price_urls.get(ticker)
+            if url is None:
+                url = self._price_urls[ticker] = self._last_trade_tmpl.format(ticker=ticker)
+
+            status, data = await self._get_json(url, self._base_params)
+
+            if status == 403:
+                logger.error(f"Authentication error with Polygon API for {ticker}: Check API key or subscription plan")
+                # Mark this as a global issue, not ticker-specific
+                self.api_auth_error = True
+                return None
+
+            if status == 404:
+                logger.warning(f"Ticker {ticker} not found on Polygon")
+                return {"not_found": True, "source": self.source_name}
+
+            if status != 200 or data is None:
+                logger.warning(f"Failed to get price for {ticker}: Status {status}")
+                return None
+
+            # Check if we have valid data
+            if data.get("status") != "success" or "results" not in data:
+                logger.warning(f"Invalid data for {ticker}: {data}")
+                return None
+
+            trade = data["results"]
+
+            # Convert Unix timestamp (ms) to datetime in Eastern Time
+            trade_time = datetime.fromtimestamp(trade["t"] / 1000)
+            eastern = pytz.timezone('US/Eastern')
+            price_time_et = eastern.localize(trade_time)
+
+            # Format time string for display
+            price_time_str = price_time_et.strftime("%Y-%m-%d %I:%M:%S %p %Z")
+
+            return {
+                "price": float(trade["p"]),  # price
+                "timestamp": datetime.utcnow(),  # when we retrieved it
+                "price_timestamp": price_time_et,  # when the price was recorded
+                "price_timestamp_str": price_time_str,  # formatted string for display
+                "volume": int(trade["s"]) if "s" in trade else None,  # size (volume)
+                "source": self.source_name
+            }
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Network error getting price for {ticker} from Polygon: {str(e)}")
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            # Schema surprises deserve a traceback, not a silent "no data"
+            logger.exception(f"Unexpected response shape for {ticker} from Polygon: {str(e)}")
             return None
     
     async def get_batch_prices(self, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
@@ -115,67 +263,107 @@ class PolygonClient(MarketDataSource):
             Dictionary mapping tickers to their price data
         """
         results = {}
-        
-        # Process each ticker individually
-        for ticker in tickers:
-            price_data = await self.get_current_price(ticker)
+
+        # Fetch tickers concurrently, with a semaphore capping in-flight
+        # requests. No per-ticker sleeps here: pacing is delegated to
+        # self._rate_limiter and the session's TCPConnector limits, so paid
+        # tiers aren't throttled below their real quota by arbitrary delays.
+        sem = asyncio.Semaphore(self._max_concurrency)
+
+        async def fetch_one(ticker: str):
+            async with sem:
+                return ticker, await self.get_current_price(ticker)
+
+        pairs = await asyncio.gather(
+            *[fetch_one(ticker) for ticker in tickers],
+            return_exceptions=True
+        )
+
+        for pair in pairs:
+            if isinstance(pair, Exception):
+                logger.error(f"Error in batch price lookup: {str(pair)}")
+                continue
+            ticker, price_data = pair
             if price_data:
                 results[ticker] = price_data
-            
-            # Add a short delay to avoid rate limiting
-            await asyncio.sleep(0.2)
-        
+
         return results
     
+    async def _fetch_ticker_details(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the reference ticker details payload.
+        Returns the details dict, a not_found marker, or None on failure.
+        """
+        url = self._ticker_details_tmpl.format(ticker=ticker)
+
+        status, data = await self._get_json(url, self._base_params)
+
+        if status == 404:
+            logger.warning(f"Ticker {ticker} not found on Polygon")
+            return {"not_found": True}
+
+        if status != 200 or data is None:
+            logger.warning(f"Failed to get ticker details for {ticker}: Status {status}")
+            return None
+
+        # Check if we have valid data
+        if data.get("status") != "OK" or "results" not in data:
+            logger.warning(f"Invalid ticker details for {ticker}: {data}")
+            return None
+
+        return data["results"]
+
+    async def _fetch_financials(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """Fetch the most recent financials report, or None if unavailable"""
+        url = self._financials_tmpl.format(ticker=ticker)
+
+        status, data = await self._get_json(url, self._financials_params)
+        if status == 200 and data is not None:
+            if data.get("status") == "OK" and "results" in data and data["results"]:
+                return data["results"][0]
+        return None
+
     async def get_company_metrics(self, ticker: str) -> Optional[Dict[str, Any]]:
         """
         Get company metrics for a ticker
-        
+
         Args:
             ticker: Ticker symbol
-            
+
         Returns:
             Dictionary with company metrics or None if unavailable
         """
         try:
-            # For Polygon, we need to make a few separate API calls to get all the metrics
-            url = f"{self.base_url}/v3/reference/tickers/{ticker}"
-            params = {"apiKey": self.api_key}
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 404:
-                        logger.warning(f"Ticker {ticker} not found on Polygon")
-                        return {"not_found": True, "source": self.source_name}
-                        
-                    if response.status != 200:
-                        logger.warning(f"Failed to get ticker details for {ticker}: Status {response.status}")
-                        return None
-                        
-                    data = await response.json()
-                    
-                    # Check if we have valid data
-                    if data.get("status") != "OK" or "results" not in data:
-                        logger.warning(f"Invalid ticker details for {ticker}: {data}")
-                        return None
-                        
-                    ticker_details = data["results"]
-                    
-            # Get financials for additional metrics
-            url = f"{self.base_url}/v2/reference/financials/{ticker}"
-            params = {
-                "apiKey": self.api_key,
-                "limit": 1  # Just get the most recent report
-            }
-            
-            financials = None
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("status") == "OK" and "results" in data and data["results"]:
-                            financials = data["results"][0]
-                    
+            # Company metadata changes rarely - serve repeat queries from cache
+            # to preserve the small free-tier call budget
+            cache_key = f"polygon:metrics:{ticker}"
+            if FastCache.is_available():
+                cached = FastCache.get(cache_key)
+                if cached:
+                    return cached
+
+            # Details and financials are independent endpoints - fetch them
+            # concurrently so the method costs max() rather than sum() of the RTTs
+            ticker_details, financials = await asyncio.gather(
+                self._fetch_ticker_details(ticker),
+                self._fetch_financials(ticker),
+                return_exceptions=True
+            )
+
+            if isinstance(financials, Exception):
+                logger.warning(f"Error getting financials for {ticker}: {str(financials)}")
+                financials = None
+
+            if isinstance(ticker_details, Exception):
+                logger.error(f"Error getting ticker details for {ticker}: {str(ticker_details)}")
+                return None
+
+            if ticker_details is None:
+                return None
+
+            if ticker_details.get("not_found"):
+                return {"not_found": True, "source": self.source_name}
+
             # Combine the data
             metrics = {
                 "company_name": ticker_details.get("name"),
@@ -193,11 +381,17 @@ class PolygonClient(MarketDataSource):
                     "eps": financials.get("ratios", {}).get("earningsPerBasicShare"),
                     "dividend_rate": financials.get("metrics", {}).get("annual_dividend_per_share")
                 })
-                
+
+            if FastCache.is_available():
+                FastCache.set(cache_key, metrics, METRICS_CACHE_SECONDS)
+
             return metrics
                 
-        except Exception as e:
-            logger.error(f"Error getting company metrics for {ticker} from Polygon: {str(e)}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Network error getting company metrics for {ticker} from Polygon: {str(e)}")
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.exception(f"Unexpected metrics response shape for {ticker} from Polygon: {str(e)}")
             return None
     
     async def get_historical_prices(self, ticker: str, start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
@@ -221,38 +415,57 @@ class PolygonClient(MarketDataSource):
             start_ms = int(start_date.timestamp() * 1000)
             end_ms = int(end_date.timestamp() * 1000)
             
-            # Build the URL for aggregates endpoint
-            url = f"{self.base_url}/v2/aggs/ticker/{ticker}/range/1/day/{start_ms}/{end_ms}"
-            params = {"apiKey": self.api_key, "sort": "asc"}
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status != 200:
-                        logger.warning(f"Failed to get historical data for {ticker}: Status {response.status}")
-                        return []
-                        
-                    data = await response.json()
-                    
-                    # Check if we have valid data
-                    if data.get("status") != "OK" or "results" not in data:
-                        logger.warning(f"Invalid historical data for {ticker}: {data}")
-                        return []
-                        
-                    results = []
-                    for bar in data["results"]:
-                        results.append({
-                            "date": datetime.fromtimestamp(bar["t"] / 1000).date(),
-                            "timestamp": datetime.fromtimestamp(bar["t"] / 1000),
-                            "open": float(bar["o"]),
-                            "high": float(bar["h"]),
-                            "low": float(bar["l"]),
-                            "close": float(bar["c"]),
-                            "volume": int(bar["v"]),
-                            "source": self.source_name
-                        })
-                    
-                    return results
-                    
-        except Exception as e:
-            logger.error(f"Error getting historical data for {ticker} from Polygon: {str(e)}")
+            # The raw bars are JSON-safe, so cache those and rebuild rows on a hit
+            cache_key = f"polygon:history:{ticker}:{start_ms}:{end_ms}"
+            bars = FastCache.get(cache_key) if FastCache.is_available() else None
+
+            if bars is None:
+                # Build the URL for aggregates endpoint
+                url = self._aggs_tmpl.format(ticker=ticker, start_ms=start_ms, end_ms=end_ms)
+
+                status, data = await self._get_json(url, self._aggs_params)
+
+                if status != 200 or data is None:
+                    logger.warning(f"Failed to get historical data for {ticker}: Status {status}")
+                    return []
+
+                # Check if we have valid data
+                if data.get("status") != "OK" or "results" not in data:
+                    logger.warning(f"Invalid historical data for {ticker}: {data}")
+                    return []
+
+                bars = data["results"]
+                if FastCache.is_available():
+                    FastCache.set(cache_key, bars, HISTORY_CACHE_SECONDS)
+
+            # Hot loop for multi-year pulls: bind lookups once, convert each
+            # timestamp a single time, and build every row in one pass.
+            # Bar timestamps are epoch milliseconds, i.e. UTC - make that
+            # explicit instead of producing naive local-time datetimes.
+            fromtimestamp = datetime.fromtimestamp
+            source_name = self.source_name
+            utc = timezone.utc
+
+            results = []
+            append = results.append
+            for bar in bars:
+                dt = fromtimestamp(bar["t"] / 1000, tz=utc)
+                append({
+                    "date": dt.date(),
+                    "timestamp": dt,
+                    "open": float(bar["o"]),
+                    "high": float(bar["h"]),
+                    "low": float(bar["l"]),
+                    "close": float(bar["c"]),
+                    "volume": int(bar["v"]),
+                    "source": source_name
+                })
+
+            return results
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Network error getting historical data for {ticker} from Polygon: {str(e)}")
+            return []
+        except (KeyError, ValueError, TypeError) as e:
+            logger.exception(f"Unexpected historical response shape for {ticker} from Polygon: {str(e)}")
             return []
\ No newline at end of file
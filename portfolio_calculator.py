@@ -26,6 +26,17 @@ logger = logging.getLogger("portfolio_calculator")
 DATABASE_URL = os.getenv("DATABASE_URL")
 database = databases.Database(DATABASE_URL)
 
+def portfolio_cache_key(suffix: str) -> str:
+    """
+    Build a portfolio cache key under the current namespace version
+
+    Keys embed the portfolio:ver counter, so invalidation is a single INCR
+    (see FastCache.incr) - old-version keys are orphaned and expire via
+    their TTL rather than being SCANned and deleted.
+    """
+    version = FastCache.get("portfolio:ver") or 0
+    return f"portfolio:v{version}:{suffix}"
+
 class PortfolioCalculator:
     """
     Handles portfolio calculations based on current security prices.
@@ -180,7 +191,7 @@ class PortfolioCalculator:
             
             # Invalidate cached user portfolio calculations
             if FastCache.is_available():
-                FastCache.delete_pattern("portfolio:user:*")
+                FastCache.incr("portfolio:ver")
                 logger.info("Invalidated cached user portfolio calculations")
             
             return result
@@ -213,7 +224,7 @@ class PortfolioCalculator:
             Summary of updates made
         """
         # Generate cache key
-        cache_key = f"portfolio:user:{user_id}"
+        cache_key = portfolio_cache_key(f"user:{user_id}")
         
         # Check cache first
         if FastCache.is_available():
@@ -537,7 +548,7 @@ class PortfolioCalculator:
             Performance metrics
         """
         # Generate cache key
-        cache_key = f"portfolio:performance:{user_id}:{period}"
+        cache_key = portfolio_cache_key(f"performance:{user_id}:{period}")
         
         # Check cache first
         if FastCache.is_available():
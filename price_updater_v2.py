@@ -1,1278 +1,1700 @@
-"""
-Enhanced price updater that uses multiple data sources and is decoupled from
-portfolio calculations.
-"""
-import os
-import logging
-import asyncio
-import databases
-import sqlalchemy
-from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any, Optional, Set
-from dotenv import load_dotenv
-
-# Import our modules
-from api_clients.market_data_manager import MarketDataManager
-from utils.common import record_system_event, update_system_event
-from redis_cache import FastCache
-
-# Load environment variables
-load_dotenv()
-
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("price_updater_v2")
-
-# Initialize Database Connection
-DATABASE_URL = os.getenv("DATABASE_URL")
-database = databases.Database(DATABASE_URL)
-
-class PriceUpdaterV2:
-    """
-    Enhanced price updater that uses multiple data sources.
-    This is decoupled from portfolio calculations.
-    """
-    
-    def __init__(self):
-        """Initialize the price updater with necessary clients"""
-        self.database = database
-        self.market_data = MarketDataManager()
-    
-    async def connect(self):
-        """Connect to the database"""
-        if not self.database.is_connected:
-            await self.database.connect()
-    
-    async def disconnect(self):
-        """Disconnect from the database"""
-        if self.database.is_connected:
-            await self.database.disconnect()
-    
-    async def get_active_tickers(self) -> List[str]:
-        """
-        Get all active tickers from the database
-        
-        Returns:
-            List of active ticker symbols
-        """
-        query = """
-            SELECT ticker 
-            FROM securities 
-            WHERE active = true
-        """
-        
-        result = await self.database.fetch_all(query)
-        return [row['ticker'] for row in result]
-    
-    async def mark_ticker_unavailable(self, ticker: str) -> None:
-        """
-        Mark a ticker as unavailable
-        
-        Args:
-            ticker: Ticker symbol to mark as unavailable
-        """
-        query = """
-            UPDATE securities 
-            SET on_yfinance = false
-            WHERE ticker = :ticker
-        """
-        
-        await self.database.execute(query, {"ticker": ticker})
-        logger.warning(f"Marked ticker {ticker} as unavailable")
-    
-# In price_updater_v2.py - update_security_prices method
-
-    async def update_security_prices(self, tickers=None, max_tickers=None) -> Dict[str, Any]:
-            """
-            Update current prices for securities using multiple data sources
-            
-            Args:
-                tickers: Optional list of specific tickers to update
-                max_tickers: Maximum number of tickers to update (for testing)
-                
-            Returns:
-                Summary of updates made
-            """
-            try:
-                await self.connect()
-                
-                # Record the start of this operation
-                event_id = await record_system_event(
-                    self.database, 
-                    "price_update", 
-                    "started", 
-                    {"source": "multiple", "tickers": tickers}
-                )
-                
-                # Start timing
-                start_time = datetime.now()
-                
-                # Get tickers with source availability info
-                if tickers:
-                    # If specific tickers provided, get their source availability info
-                    placeholders = ', '.join([f"'{ticker}'" for ticker in tickers])
-                    query = f"""
-                        SELECT 
-                            ticker, 
-                            on_yfinance, 
-                            on_polygon
-                        FROM securities 
-                        WHERE ticker IN ({placeholders})
-                        AND active = true
-                    """
-                else:
-                    # Get all active tickers with their source availability info
-                    query = """
-                    SELECT 
-                        ticker, 
-                        on_yfinance, 
-                        on_polygon
-                    FROM securities 
-                    WHERE active = true
-                    """
-                
-                ticker_data = await self.database.fetch_all(query)
-                
-                # Organize tickers by preferred data source
-                polygon_tickers = []
-                yfinance_tickers = []
-                unavailable_tickers = []
-                
-                for row in ticker_data:
-                    ticker = row["ticker"]
-                    # Check Polygon first (preferred source)
-                    if row["on_polygon"] is None or row["on_polygon"] == True:
-                        polygon_tickers.append(ticker)
-                    # Then check Yahoo Finance
-                    elif row["on_yfinance"] is None or row["on_yfinance"] == True:
-                        yfinance_tickers.append(ticker)
-                    else:
-                        # Ticker isn't available on any source
-                        unavailable_tickers.append(ticker)
-                
-                # Apply max_tickers limit if specified
-                all_available_tickers = polygon_tickers + yfinance_tickers
-                if max_tickers and len(all_available_tickers) > max_tickers:
-                    # Maintain the source priority when limiting
-                    total_to_process = max_tickers
-                    polygon_count = min(len(polygon_tickers), total_to_process)
-                    yfinance_count = min(len(yfinance_tickers), total_to_process - polygon_count)
-                    
-                    polygon_tickers = polygon_tickers[:polygon_count]
-                    yfinance_tickers = yfinance_tickers[:yfinance_count]
-                
-                logger.info(f"Processing {len(polygon_tickers)} tickers with Polygon and {len(yfinance_tickers)} with Yahoo Finance")
-                logger.info(f"Skipping {len(unavailable_tickers)} unavailable tickers")
-                
-                # Track statistics
-                update_count = 0
-                polygon_success = 0
-                yfinance_success = 0
-                sources_used = set()
-                price_updates = {}
-                processed_tickers = set()
-                failed_tickers = []
-                
-                # Try Polygon tickers first
-                if polygon_tickers:
-                    logger.info(f"Fetching prices from Polygon for {len(polygon_tickers)} tickers")
-                    polygon_source = self.market_data.sources.get("polygon")
-                    
-                    if polygon_source:
-                        polygon_results = await polygon_source.get_batch_prices(polygon_tickers)
-                        sources_used.add("polygon")
-                        
-                        # Process successful results
-                        for ticker, data in polygon_results.items():
-                            # Update the security record
-                            await self.database.execute(
-                                """
-                                UPDATE securities 
-                                SET 
-                                    current_price = :price, 
-                                    last_updated = :timestamp,
-                                    price_timestamp = :price_timestamp_str,
-                                    data_source = :source,
-                                    on_polygon = TRUE
-                                WHERE ticker = :ticker
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "price": data["price"],
-                                    "timestamp": datetime.utcnow(),
-                                    "price_timestamp_str": data.get("price_timestamp_str"),
-                                    "source": "polygon"
-                                }
-                            )
-                            
-                            # Add to price history
-                            await self.database.execute(
-                                """
-                                INSERT INTO price_history 
-                                (ticker, close_price, timestamp, date, source)
-                                VALUES (:ticker, :price, :timestamp, :date, :source)
-                                ON CONFLICT (ticker, date) DO UPDATE
-                                SET close_price = :price, timestamp = :timestamp, source = :source
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "price": data["price"],
-                                    "timestamp": datetime.utcnow(),
-                                    "date": datetime.utcnow().date(),
-                                    "source": "polygon"
-                                }
-                            )
-                            
-                            # Store update information
-                            price_updates[ticker] = {
-                                "price": data["price"],
-                                "source": "polygon",
-                                "timestamp": datetime.utcnow().isoformat()
-                            }
-                            
-                            processed_tickers.add(ticker)
-                            update_count += 1
-                            polygon_success += 1
-                        
-                        # Identify failed Polygon tickers to try with Yahoo Finance
-                        failed_polygon_tickers = [t for t in polygon_tickers if t not in processed_tickers]
-                        logger.info(f"{len(failed_polygon_tickers)} tickers failed with Polygon, adding to Yahoo Finance queue")
-                        
-                        # Mark tickers not found on Polygon
-                        for ticker in failed_polygon_tickers:
-                            await self.database.execute(
-                                "UPDATE securities SET on_polygon = FALSE WHERE ticker = :ticker",
-                                {"ticker": ticker}
-                            )
-                            
-                        # Add failed Polygon tickers to Yahoo Finance queue if they're not already known to be unavailable
-                        yfinance_tickers.extend(failed_polygon_tickers)
-                
-                # Process Yahoo Finance tickers
-                if yfinance_tickers:
-                    logger.info(f"Fetching prices from Yahoo Finance for {len(yfinance_tickers)} tickers")
-                    yf_source = self.market_data.sources.get("yahoo_finance")
-                    
-                    if yf_source:
-                        yf_results = await yf_source.get_batch_prices(yfinance_tickers)
-                        sources_used.add("yahoo_finance")
-                        
-                        # Process successful results
-                        for ticker, data in yf_results.items():
-                            # Skip if we already processed this ticker with Polygon
-                            if ticker in processed_tickers:
-                                continue
-                                
-                            # Update the security record - don't set on_yfinance=FALSE on timeout
-                            # Find this section of code in update_security_prices
-                            await self.database.execute(
-                                """
-                                UPDATE securities 
-                                SET 
-                                    current_price = :price, 
-                                    last_updated = :timestamp,
-                                    price_timestamp = :price_timestamp,
-                                    day_open = :day_open,
-                                    day_high = :day_high,
-                                    day_low = :day_low,
-                                    volume = :volume,
-                                    data_source = :source
-                                WHERE ticker = :ticker
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "price": data["price"],
-                                    "timestamp": datetime.utcnow(),
-                                    "price_timestamp": data.get("price_timestamp"),
-                                    "day_open": data.get("day_open"),  
-                                    "day_high": data.get("day_high"),  
-                                    "day_low": data.get("day_low"),    
-                                    "volume": data.get("volume"),
-                                    "source": "yahoo_finance"
-                                }
-                            )
-
-                            await self.database.execute(
-                                """
-                                INSERT INTO price_history 
-                                (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, price_timestamp, source)
-                                VALUES (:ticker, :price, :day_open, :day_high, :day_low, :volume, :timestamp, :date, :price_timestamp, :source)
-                                ON CONFLICT (ticker, date) DO UPDATE
-                                SET close_price = :price, 
-                                    day_open = :day_open,
-                                    day_high = :day_high,
-                                    day_low = :day_low,
-                                    volume = :volume,
-                                    timestamp = :timestamp, 
-                                    price_timestamp = :price_timestamp,
-                                    source = :source
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "price": data["price"],
-                                    "day_open": data.get("day_open"),  
-                                    "day_high": data.get("day_high"),  
-                                    "day_low": data.get("day_low"),    
-                                    "volume": data.get("volume"),
-                                    "timestamp": datetime.utcnow(),
-                                    "date": datetime.utcnow().date(),
-                                    "price_timestamp": data.get("price_timestamp"),
-                                    "source": "yahoo_finance"
-                                }
-                            )
-                            
-                            # Store update information
-                            price_updates[ticker] = {
-                                "price": data["price"],
-                                "source": "yahoo_finance",
-                                "timestamp": datetime.utcnow().isoformat()
-                            }
-                            
-                            processed_tickers.add(ticker)
-                            update_count += 1
-                            yfinance_success += 1
-                        
-                        # Identify failed Yahoo Finance tickers
-                        failed_yf_tickers = [t for t in yfinance_tickers if t not in processed_tickers]
-                        
-                        # Don't automatically mark as unavailable - YF timeouts shouldn't be treated as "not found"
-                        failed_tickers.extend(failed_yf_tickers)
-                        logger.warning(f"{len(failed_yf_tickers)} tickers failed with Yahoo Finance")
-                
-                # Calculate duration
-                duration = (datetime.now() - start_time).total_seconds()
-                
-                # Record completion
-                result = {
-                    "total_tickers_evaluated": len(ticker_data),
-                    "unavailable_tickers_count": len(unavailable_tickers),
-                    "updated_count": update_count,
-                    "polygon_success": polygon_success,
-                    "yfinance_success": yfinance_success,
-                    "failed_tickers_count": len(failed_tickers),
-                    "sources_used": list(sources_used),
-                    "duration_seconds": duration
-                }
-                
-                await update_system_event(
-                    self.database,
-                    event_id,
-                    "completed",
-                    result
-                )
-                
-                logger.info(f"Price update completed: {update_count} tickers updated in {duration:.2f} seconds")
-                logger.info(f"Sources used: {', '.join(sources_used)}")
-                logger.info(f"Polygon: {polygon_success} tickers, Yahoo Finance: {yfinance_success} tickers")
-                
-                # After successful update, invalidate relevant caches
-                if FastCache.is_available():
-                    # Invalidate cached portfolio calculations
-                    FastCache.delete_pattern("portfolio:*")
-                    
-                    # Invalidate cached security data for processed tickers
-                    for ticker in processed_tickers:
-                        FastCache.delete(f"security:{ticker}")
-                        FastCache.delete(f"security_history:{ticker}*")
-                        
-                    # Invalidate securities list
-                    FastCache.delete("securities:all")
-                    
-                    logger.info(f"Invalidated cache for {len(processed_tickers)} securities")
-                
-                return result
-                
-            except Exception as e:
-                logger.error(f"Error updating security prices: {str(e)}")
-                
-                # Record failure
-                if 'event_id' in locals() and event_id:
-                    await update_system_event(
-                        self.database,
-                        event_id,
-                        "failed",
-                        {"error": str(e)},
-                        str(e)
-                    )
-                
-                raise
-            finally:
-                await self.disconnect()
-              
-    async def update_company_metrics(self, tickers=None, max_tickers=None) -> Dict[str, Any]:
-        try:
-            await self.connect()
-            
-            # Record the start of this operation
-            event_id = await record_system_event(
-                self.database, 
-                "metrics_update", 
-                "started", 
-                {"tickers": tickers}
-            )
-            
-            # Start timing
-            start_time = datetime.now(timezone.utc)
-            
-            # Get active tickers
-            if tickers:
-                placeholders = ', '.join([f"'{ticker}'" for ticker in tickers])
-                query = f"""
-                    SELECT ticker 
-                    FROM securities 
-                    WHERE ticker IN ({placeholders})
-                    AND (
-                        (on_yfinance IS NULL OR on_yfinance = true) 
-                        OR 
-                        (on_polygon IS NULL OR on_polygon = true)
-                    )
-                """
-                result = await self.database.fetch_all(query)
-                all_tickers = [row['ticker'] for row in result]
-                
-                missing_tickers = set(tickers) - set(all_tickers)
-                if missing_tickers:
-                    logger.warning(f"Tickers not found in database or unavailable on all sources: {missing_tickers}")
-            else:
-                query = """
-                SELECT ticker 
-                FROM securities 
-                WHERE active = true 
-                AND (
-                    (on_yfinance IS NULL OR on_yfinance = true) 
-                    OR 
-                    (on_polygon IS NULL OR on_polygon = true)
-                )
-                """
-                result = await self.database.fetch_all(query)
-                all_tickers = [row['ticker'] for row in result]
-            
-            # Apply max_tickers limit if specified
-            if max_tickers and len(all_tickers) > max_tickers:
-                selected_tickers = all_tickers[:max_tickers]
-            else:
-                selected_tickers = all_tickers
-                
-            logger.info(f"Updating metrics for {len(selected_tickers)} securities")
-            
-            # Track statistics
-            update_count = 0
-            unavailable_count = 0
-            not_found_tickers = []  # Track tickers not found on any source
-            sources_used = set()
-            metrics_updates = {}
-            updated_tickers = set()
-            
-            # Process each ticker individually
-            for ticker in selected_tickers:
-                try:
-                    # Get company metrics
-                    metrics = await self.market_data.get_company_metrics(ticker)
-                    
-                    # Check if metrics are completely unavailable
-                    if not metrics or metrics.get("not_found"):
-                        logger.warning(f"No metrics available for {ticker}")
-                        unavailable_count += 1
-                        not_found_tickers.append(ticker)
-                        
-                        # Mark the ticker as unavailable on YFinance
-                        await self.database.execute(
-                            """
-                            UPDATE securities 
-                            SET 
-                                on_yfinance = FALSE,
-                                last_metrics_update = NOW()
-                            WHERE ticker = :ticker
-                            """,
-                            {"ticker": ticker}
-                        )
-                        
-                        continue
-                    
-                    # Prepare update dictionary with type conversion and safe casting
-                    update_data = {
-                        "ticker": ticker,
-                        "company_name": str(metrics.get("company_name", ""))[:255],
-                        "sector": str(metrics.get("sector", ""))[:100],
-                        "industry": str(metrics.get("industry", ""))[:100],
-                        "market_cap": metrics.get("market_cap"),
-                        "current_price": metrics.get("current_price"),
-                        "previous_close": metrics.get("previous_close"),
-                        "day_open": metrics.get("day_open"),
-                        "day_low": metrics.get("day_low"),
-                        "day_high": metrics.get("day_high"),
-                        "volume": metrics.get("volume"),
-                        "average_volume": metrics.get("average_volume"),
-                        "pe_ratio": metrics.get("pe_ratio"),
-                        "forward_pe": metrics.get("forward_pe"),
-                        "beta": metrics.get("beta"),
-                        "fifty_two_week_low": metrics.get("fifty_two_week_low"),
-                        "fifty_two_week_high": metrics.get("fifty_two_week_high"),
-                        "market_cap": metrics.get("market_cap"),
-                        "timestamp": datetime.now(timezone.utc),
-                        "source": metrics.get("source", "unknown"),
-                        "eps": metrics.get("eps"),
-                        "forward_eps": metrics.get("forward_eps"),
-                        "fifty_two_week_range": metrics.get("fifty_two_week_range"),
-                        "target_median_price": metrics.get("target_median_price"),
-                        "bid_price": metrics.get("bid_price"),
-                        "ask_price": metrics.get("ask_price")
-                    }
-                    
-                    # Type-safe column mapping with conversion
-                    column_mapping = {
-                        "current_price": ("current_price", float),
-                        "previous_close": ("previous_close", float),
-                        "day_open": ("day_open", float),
-                        "day_low": ("day_low", float), 
-                        "day_high": ("day_high", float),
-                        "volume": ("volume", int),
-                        "average_volume": ("average_volume", int),
-                        "pe_ratio": ("pe_ratio", float),
-                        "forward_pe": ("forward_pe", float),
-                        "dividend_rate": ("dividend_rate", float),
-                        "dividend_yield": ("dividend_yield", float),
-                        "target_high_price": ("target_high_price", float),
-                        "target_low_price": ("target_low_price", float),
-                        "target_mean_price": ("target_mean_price", float),
-                        "beta": ("beta", float),
-                        "fifty_two_week_low": ("fifty_two_week_low", float),
-                        "fifty_two_week_high": ("fifty_two_week_high", float),
-                        "eps": ("eps", float),
-                        "forward_eps": ("forward_eps", float),
-                        "bid_price": ("bid_price", float),
-                        "ask_price": ("ask_price", float),
-                        "target_median_price": ("target_median_price", float),
-                        "fifty_two_week_range": ("fifty_two_week_range", str)
-                    }
-                    
-                    for key in ['market_cap', 'target_mean_price']:
-                        if key in update_data and update_data[key] is not None:
-                            try:
-                                update_data[key] = float(update_data[key])
-                            except (ValueError, TypeError):
-                                logger.warning(f"Could not convert {key} for {ticker}")
-                                # Set to None if conversion fails
-                                update_data[key] = None
-                    
-                    # Add columns to update with type conversion
-                    for metric_key, (db_column, conversion_func) in column_mapping.items():
-                        if metric_key in metrics and metrics[metric_key] is not None:
-                            try:
-                                update_data[db_column] = conversion_func(metrics[metric_key])
-                            except (ValueError, TypeError):
-                                logger.warning(f"Could not convert {metric_key} for {ticker}")
-                                
-                    # Add this right before executing the database query
-                    if "timestamp" in update_data and update_data["timestamp"] is not None:
-                        if update_data["timestamp"].tzinfo is not None:
-                            # Remove timezone info for PostgreSQL
-                            update_data["timestamp"] = update_data["timestamp"].replace(tzinfo=None)
-                    
-                    # Construct dynamic SQL query
-                    query = """
-                    UPDATE securities 
-                    SET 
-                        company_name = CAST(:company_name AS VARCHAR),
-                        sector = CAST(:sector AS VARCHAR),
-                        industry = CAST(:industry AS VARCHAR),
-                        market_cap = CAST(:market_cap AS NUMERIC),
-                        current_price = CAST(:current_price AS NUMERIC),
-                        previous_close = CAST(:previous_close AS NUMERIC),
-                        day_open = CAST(:day_open AS NUMERIC),
-                        day_low = CAST(:day_low AS NUMERIC),
-                        day_high = CAST(:day_high AS NUMERIC),
-                        volume = CAST(:volume AS BIGINT),
-                        average_volume = CAST(:average_volume AS BIGINT),
-                        pe_ratio = CAST(:pe_ratio AS NUMERIC),
-                        forward_pe = CAST(:forward_pe AS NUMERIC),
-                        dividend_rate = CAST(:dividend_rate AS NUMERIC),
-                        dividend_yield = CAST(:dividend_yield AS NUMERIC),
-                        target_high_price = CAST(:target_high_price AS NUMERIC),
-                        target_low_price = CAST(:target_low_price AS NUMERIC),
-                        target_mean_price = CAST(:target_mean_price AS NUMERIC),
-                        target_median_price = CAST(:target_median_price AS NUMERIC),
-                        beta = CAST(:beta AS NUMERIC),
-                        fifty_two_week_low = CAST(:fifty_two_week_low AS NUMERIC),
-                        fifty_two_week_high = CAST(:fifty_two_week_high AS NUMERIC),
-                        fifty_two_week_range = CAST(:fifty_two_week_range AS TEXT),
-                        eps = CAST(:eps AS NUMERIC),
-                        forward_eps = CAST(:forward_eps AS NUMERIC),
-                        bid_price = CAST(:bid_price AS NUMERIC),
-                        ask_price = CAST(:ask_price AS NUMERIC),
-                        last_metrics_update = CAST(:timestamp AS TIMESTAMP),
-                        metrics_source = CAST(:source AS VARCHAR),
-                        on_yfinance = CASE WHEN :source = 'yahoo_finance' THEN TRUE ELSE on_yfinance END
-                    WHERE ticker = :ticker
-                    """
-                    
-                    # Log the update data for debugging
-                    logger.info(f"Update data for {ticker}: {update_data}")
-                    
-                    # Execute the update
-                    await self.database.execute(query, update_data)
-                    
-                    # Store metrics information for response
-                    metrics_updates[ticker] = {
-                        "company_name": update_data.get("company_name"),
-                        "sector": update_data.get("sector"),
-                        "current_price": update_data.get("current_price"),
-                        "source": update_data.get("source"),
-                        "timestamp": datetime.now().replace(tzinfo=None),
-                    }
-                    
-                    updated_tickers.add(ticker)
-                    update_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error updating metrics for {ticker}: {str(e)}")
-                    logger.error(f"Problematic metrics: {metrics}")
-                    unavailable_count += 1
-                    not_found_tickers.append(ticker)
-            
-            # Create comprehensive result
-            result = {
-                "total_tickers": len(selected_tickers),
-                "updated_count": update_count,
-                "unavailable_count": unavailable_count,
-                "not_found_tickers": not_found_tickers,
-                "updated_tickers": list(updated_tickers),
-                "duration_seconds": (datetime.now(timezone.utc) - start_time).total_seconds()
-            }
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Comprehensive error updating metrics: {str(e)}")
-            raise
-        finally:
-            await self.disconnect()
-            
-    async def update_historical_prices(self, tickers=None, max_tickers=None, days=30, batch_size=5) -> Dict[str, Any]:
-        """
-        Update historical prices for securities with batch processing
-        
-        Args:
-            tickers: Optional list of specific tickers to update
-            max_tickers: Maximum number of tickers to update (for testing)
-            days: Number of days of history to fetch
-            batch_size: Size of batches for API calls
-            
-        Returns:
-            Summary of updates made
-        """
-        try:
-            await self.connect()
-            
-            # Record the start of this operation
-            event_id = await record_system_event(
-                self.database, 
-                "history_update", 
-                "started", 
-                {"days": days, "tickers": tickers, "batch_size": batch_size}
-            )
-            
-            # Start timing
-            start_time = datetime.now()
-            
-            # Get tickers to update
-            if tickers:
-                # If specific tickers provided, validate they exist in the database
-                placeholders = ', '.join([f"'{ticker}'" for ticker in tickers])
-                query = f"""
-                    SELECT ticker 
-                    FROM securities 
-                    WHERE ticker IN ({placeholders})
-                """
-                result = await self.database.fetch_all(query)
-                all_tickers = [row['ticker'] for row in result]
-                
-                # Check if any requested tickers don't exist
-                missing_tickers = set(tickers) - set(all_tickers)
-                if missing_tickers:
-                    logger.warning(f"Tickers not found in database: {missing_tickers}")
-            else:
-                # Otherwise get all active tickers
-                all_tickers = await self.get_active_tickers()
-            
-            # Apply max_tickers limit if specified
-            if max_tickers and len(all_tickers) > max_tickers:
-                selected_tickers = all_tickers[:max_tickers]
-            else:
-                selected_tickers = all_tickers
-                
-            logger.info(f"Updating historical prices for {len(selected_tickers)} securities ({days} days)")
-            
-            # Calculate date range
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-            
-            # Track statistics
-            update_count = 0
-            unavailable_count = 0
-            price_points_added = 0
-            sources_used = set()
-            history_updates = {}
-            updated_tickers = set()
-            
-            # Process tickers in batches
-            for i in range(0, len(selected_tickers), batch_size):
-                batch_tickers = selected_tickers[i:i+batch_size]
-                logger.info(f"Processing batch {i//batch_size + 1}/{(len(selected_tickers) + batch_size - 1)//batch_size}: {batch_tickers}")
-                
-                try:
-                    # Get historical data in batch if Yahoo Finance client supports it
-                    yahoo_client = self.market_data.sources.get("yahoo_finance")
-                    if hasattr(yahoo_client, "get_batch_historical_prices"):
-                        # Use batch method if available
-                        batch_results = await yahoo_client.get_batch_historical_prices(
-                            batch_tickers, start_date, end_date
-                        )
-                        sources_used.add("yahoo_finance")
-                        
-                        # Process each ticker's results from the batch
-                        for ticker, ticker_data in batch_results.items():
-                            if not ticker_data:
-                                logger.warning(f"No historical data available for {ticker} in batch")
-                                unavailable_count += 1
-                                continue
-                                
-                            ticker_points = 0
-                            # Process each data point
-                            for point in ticker_data:
-                                try:
-                                    # Insert or update price history record
-                                    await self.database.execute(
-                                        """
-                                        INSERT INTO price_history 
-                                        (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, source)
-                                        VALUES (:ticker, :close_price, :day_open, :day_high, :day_low, :volume, :timestamp, :date, :source)
-                                        ON CONFLICT (ticker, date) DO UPDATE
-                                        SET 
-                                            close_price = :close_price,
-                                            day_open = :day_open,
-                                            day_high = :day_high,
-                                            day_low = :day_low,
-                                            volume = :volume,
-                                            timestamp = :timestamp,
-                                            source = :source
-                                        """,
-                                        {
-                                            "ticker": ticker,
-                                            "close_price": point.get("close_price"),
-                                            "day_open": point.get("day_open"),
-                                            "day_high": point.get("day_high"),
-                                            "day_low": point.get("day_low"),
-                                            "volume": point.get("volume"),
-                                            "timestamp": point.get("timestamp") or datetime.utcnow(),
-                                            "date": point.get("date"),
-                                            "source": point.get("source", "unknown")
-                                        }
-                                    )                        
-                                    price_points_added += 1
-                                    ticker_points += 1
-                                    
-                                except Exception as point_error:
-                                    logger.error(f"Error adding historical price for {ticker} on {point.get('date')}: {str(point_error)}")
-                            
-                            # Store summary for this ticker
-                            history_updates[ticker] = {
-                                "points_added": ticker_points,
-                                "date_range": {
-                                    "start": start_date.isoformat(),
-                                    "end": end_date.isoformat()
-                                }
-                            }
-                            
-                            # Update security's last_backfilled timestamp
-                            await self.database.execute(
-                                """
-                                UPDATE securities 
-                                SET last_backfilled = :timestamp
-                                WHERE ticker = :ticker
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "timestamp": datetime.utcnow()
-                                }
-                            )
-                            
-                            updated_tickers.add(ticker)
-                            update_count += 1
-                    else:
-                        # Fall back to individual processing if batch method not available
-                        for ticker in batch_tickers:
-                            # Process individual ticker (using existing method)
-                            historical_data = await self.market_data.get_historical_prices(ticker, start_date, end_date)
-                            
-                            if not historical_data:
-                                logger.warning(f"No historical data available for {ticker}")
-                                unavailable_count += 1
-                                continue
-                            
-                            # Track the source that was used
-                            for point in historical_data:
-                                if "source" in point:
-                                    sources_used.add(point["source"])
-                                    break
-                            
-                            ticker_points = 0
-                            # Process each data point
-                            for point in historical_data:
-                                try:
-                                    # Insert or update price history record
-                                    await self.database.execute(
-                                        """
-                                        INSERT INTO price_history 
-                                        (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, source)
-                                        VALUES (:ticker, :close_price, :day_open, :day_high, :day_low, :volume, :timestamp, :date, :source)
-                                        ON CONFLICT (ticker, date) DO UPDATE
-                                        SET 
-                                            close_price = :close_price,
-                                            day_open = :day_open,
-                                            day_high = :day_high,
-                                            day_low = :day_low,
-                                            volume = :volume,
-                                            timestamp = :timestamp,
-                                            source = :source
-                                        """,
-                                        {
-                                            "ticker": ticker,
-                                            "close_price": point.get("close_price"),
-                                            "day_open": point.get("day_open"),
-                                            "day_high": point.get("day_high"),
-                                            "day_low": point.get("day_low"),
-                                            "volume": point.get("volume"),
-                                            "timestamp": point.get("timestamp") or datetime.utcnow(),
-                                            "date": point.get("date"),
-                                            "source": point.get("source", "unknown")
-                                        }
-                                    )                        
-                                    price_points_added += 1
-                                    ticker_points += 1
-                                    
-                                except Exception as point_error:
-                                    logger.error(f"Error adding historical price for {ticker} on {point.get('date')}: {str(point_error)}")
-                            
-                            # Store summary for this ticker
-                            history_updates[ticker] = {
-                                "points_added": ticker_points,
-                                "date_range": {
-                                    "start": start_date.isoformat(),
-                                    "end": end_date.isoformat()
-                                }
-                            }
-                            
-                            # Update security's last_backfilled timestamp
-                            await self.database.execute(
-                                """
-                                UPDATE securities 
-                                SET last_backfilled = :timestamp
-                                WHERE ticker = :ticker
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "timestamp": datetime.utcnow()
-                                }
-                            )
-                            
-                            updated_tickers.add(ticker)
-                            update_count += 1
-                
-                except Exception as batch_error:
-                    logger.error(f"Error processing batch: {str(batch_error)}")
-                    # Continue with the next batch
-                
-                # Small delay between batches to avoid rate limiting
-                await asyncio.sleep(1)
-            
-            # Calculate duration
-            duration = (datetime.now() - start_time).total_seconds()
-            
-            # Record completion
-            result = {
-                "total_tickers": len(selected_tickers),
-                "updated_count": update_count,
-                "unavailable_count": unavailable_count,
-                "price_points_added": price_points_added,
-                "sources_used": list(sources_used),
-                "history_updates": history_updates,
-                "duration_seconds": duration
-            }
-            
-            await update_system_event(
-                self.database,
-                event_id,
-                "completed",
-                result
-            )
-            
-            # After successful update, invalidate relevant caches
-            if FastCache.is_available():
-                # Invalidate security history caches
-                for ticker in updated_tickers:
-                    FastCache.delete(f"security_history:{ticker}*")
-                
-                logger.info(f"Invalidated historical data cache for {len(updated_tickers)} securities")
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error updating historical prices: {str(e)}")
-            
-            # Record failure
-            if event_id:
-                await update_system_event(
-                    self.database,
-                    event_id,
-                    "failed",
-                    {"error": str(e)},
-                    str(e)
-                )
-            
-            raise
-        finally:
-            await self.disconnect()
-
-    async def smart_update(self, update_type="all", max_tickers=None) -> Dict[str, Any]:
-            """
-            Perform a smart update of security data based on what needs updating most
-            
-            Args:
-                update_type: Type of update to perform (all, prices, metrics, history)
-                max_tickers: Maximum number of tickers to update per operation
-                
-            Returns:
-                Summary of updates made
-            """
-            try:
-                await self.connect()
-                
-                start_time = datetime.now()
-                
-                # Record the start of this operation
-                event_id = await record_system_event(
-                    self.database, 
-                    "smart_update", 
-                    "started", 
-                    {"update_type": update_type, "max_tickers": max_tickers}
-                )
-                
-                results = {}
-                
-                # Determine which tickers need price updates most urgently
-                if update_type in ["all", "prices"]:
-                    # Find tickers with oldest price updates
-                    price_query = """
-                    SELECT ticker
-                    FROM securities
-                    WHERE active = true AND on_yfinance = true
-                    ORDER BY COALESCE(last_updated, '1970-01-01') ASC
-                    LIMIT :limit
-                    """
-                    
-                    price_tickers = await self.database.fetch_all(
-                        price_query, 
-                        {"limit": max_tickers or 100}
-                    )
-                    
-                    if price_tickers:
-                        price_tickers_list = [row["ticker"] for row in price_tickers]
-                        logger.info(f"Smart update: Updating prices for {len(price_tickers_list)} securities")
-                        results["prices"] = await self.update_security_prices(
-                            tickers=price_tickers_list
-                        )
-                
-                # Determine which tickers need metrics updates most urgently
-                if update_type in ["all", "metrics"]:
-                    # Find tickers with oldest metrics updates
-                    metrics_query = """
-                    SELECT ticker
-                    FROM securities
-                    WHERE active = true AND on_yfinance = true
-                    ORDER BY COALESCE(last_metrics_update, '1970-01-01') ASC
-                    LIMIT :limit
-                    """
-                    
-                    metrics_tickers = await self.database.fetch_all(
-                        metrics_query, 
-                        {"limit": max_tickers or 50}  # Fewer tickers for metrics as it's slower
-                    )
-                    
-                    if metrics_tickers:
-                        metrics_tickers_list = [row["ticker"] for row in metrics_tickers]
-                        logger.info(f"Smart update: Updating metrics for {len(metrics_tickers_list)} securities")
-                        results["metrics"] = await self.update_company_metrics(
-                            tickers=metrics_tickers_list
-                        )
-                
-                # Determine which tickers need historical data updates most urgently
-                if update_type in ["all", "history"]:
-                    # Find tickers with oldest historical updates
-                    history_query = """
-                    SELECT ticker
-                    FROM securities
-                    WHERE active = true AND on_yfinance = true
-                    ORDER BY COALESCE(last_backfilled, '1970-01-01') ASC
-                    LIMIT :limit
-                    """
-                    
-                    history_tickers = await self.database.fetch_all(
-                        history_query, 
-                        {"limit": max_tickers or 20}  # Even fewer tickers for history as it's most intensive
-                    )
-                    
-                    if history_tickers:
-                        history_tickers_list = [row["ticker"] for row in history_tickers]
-                        logger.info(f"Smart update: Updating historical data for {len(history_tickers_list)} securities")
-                        results["history"] = await self.update_historical_prices(
-                            tickers=history_tickers_list,
-                            days=30  # Default to 30 days of history
-                        )
-                
-                # Calculate duration
-                duration = (datetime.now() - start_time).total_seconds()
-                
-                # Create summary result
-                summary = {
-                    "update_type": update_type,
-                    "duration_seconds": duration,
-                    "results": results
-                }
-                
-                # Compute overall statistics
-                total_updated = 0
-                total_unavailable = 0
-                all_sources_used = set()
-                
-                for key, result in results.items():
-                    if "updated_count" in result:
-                        total_updated += result["updated_count"]
-                    if "unavailable_count" in result:
-                        total_unavailable += result["unavailable_count"]
-                    if "sources_used" in result:
-                        all_sources_used.update(result["sources_used"])
-                
-                summary["total_updated"] = total_updated
-                summary["total_unavailable"] = total_unavailable
-                summary["all_sources_used"] = list(all_sources_used)
-                
-                # Record completion
-                await update_system_event(
-                    self.database,
-                    event_id,
-                    "completed",
-                    summary
-                )
-                
-                return summary
-                
-            except Exception as e:
-                logger.error(f"Error in smart update: {str(e)}")
-                
-                # Record failure
-                if event_id:
-                    await update_system_event(
-                        self.database,
-                        event_id,
-                        "failed",
-                        {"error": str(e)},
-                        str(e)
-                    )
-                
-                raise
-            finally:
-                await self.disconnect()
-                
-    async def update_stale_securities(self, metrics_days_threshold=7, price_days_threshold=1, max_metrics_tickers=50, max_prices_tickers=100) -> Dict[str, Any]:
-        """
-        Update securities prioritized by staleness of metrics and prices
-        """
-        try:
-            await self.connect()
-            
-            # Use a timezone-naive datetime for consistency
-            start_time = datetime.now()
-            
-            # Record the start of this operation
-            event_id = await record_system_event(
-                self.database, 
-                "stale_update", 
-                "started", 
-                {
-                    "metrics_days_threshold": metrics_days_threshold,
-                    "price_days_threshold": price_days_threshold,
-                    "max_metrics_tickers": max_metrics_tickers, 
-                    "max_prices_tickers": max_prices_tickers
-                }
-            )
-            
-            results = {}
-            
-            # Find tickers with stale metrics (older than metrics_days_threshold days)
-            metrics_query = """
-            SELECT ticker
-            FROM securities
-            WHERE active = true
-            AND (
-                last_metrics_update IS NULL 
-                OR last_metrics_update < NOW() - INTERVAL '1 days' * :days
-            )
-            ORDER BY COALESCE(last_metrics_update, '1970-01-01') ASC
-            LIMIT :limit
-            """
-            
-            metrics_tickers = await self.database.fetch_all(
-                metrics_query, 
-                {"days": metrics_days_threshold, "limit": max_metrics_tickers}
-            )
-            
-            # Find tickers with stale prices (older than price_days_threshold days)
-            price_query = """
-            SELECT ticker
-            FROM securities
-            WHERE active = true
-            AND (
-                last_updated IS NULL 
-                OR last_updated < NOW() - INTERVAL '1 days' * :days
-            )
-            ORDER BY COALESCE(last_updated, '1970-01-01') ASC
-            LIMIT :limit
-            """
-            
-            price_tickers = await self.database.fetch_all(
-                price_query, 
-                {"days": price_days_threshold, "limit": max_prices_tickers}
-            )
-            
-            # Update stale metrics
-            if metrics_tickers:
-                metrics_tickers_list = [row["ticker"] for row in metrics_tickers]
-                logger.info(f"Stale update: Updating metrics for {len(metrics_tickers_list)} securities (not updated in {metrics_days_threshold} days)")
-                results["metrics"] = await self.update_company_metrics(
-                    tickers=metrics_tickers_list
-                )
-            else:
-                logger.info(f"No stale metrics found (older than {metrics_days_threshold} days)")
-                results["metrics"] = {"updated_count": 0, "message": "No stale metrics found"}
-            
-            # Update stale prices
-            if price_tickers:
-                price_tickers_list = [row["ticker"] for row in price_tickers]
-                logger.info(f"Stale update: Updating prices for {len(price_tickers_list)} securities (not updated in {price_days_threshold} days)")
-                results["prices"] = await self.update_security_prices(
-                    tickers=price_tickers_list
-                )
-            else:
-                logger.info(f"No stale prices found (older than {price_days_threshold} days)")
-                results["prices"] = {"updated_count": 0, "message": "No stale prices found"}
-            
-            # Calculate duration
-            duration = (datetime.now() - start_time).total_seconds()
-            
-            # Create summary result
-            summary = {
-                "metrics_days_threshold": metrics_days_threshold,
-                "price_days_threshold": price_days_threshold,
-                "duration_seconds": duration,
-                "metrics_count": len(metrics_tickers) if metrics_tickers else 0,
-                "prices_count": len(price_tickers) if price_tickers else 0,
-                "results": results
-            }
-            
-            # Record completion
-            await update_system_event(
-                self.database,
-                event_id,
-                "completed",
-                summary
-            )
-            
-            return summary
-            
-        except Exception as e:
-            logger.error(f"Error in stale update: {str(e)}")
-            
-            # Record failure
-            if 'event_id' in locals() and event_id:
-                await update_system_event(
-                    self.database,
-                    event_id,
-                    "failed",
-                    {"error": str(e)},
-                    str(e)
-                )
-            
-            raise
-        finally:
-            await self.disconnect()
-            
-
-# Standalone execution function
-async def run_price_update(update_type: str = "prices", max_tickers: int = None, tickers_list: List[str] = None, days: int = 30):
-    updater = PriceUpdaterV2()
-    try:
-        result = None
-        
-        if update_type == "prices":
-            result = await updater.update_security_prices(tickers=tickers_list, max_tickers=max_tickers)
-            print(f"Price update complete: {result}")
-        elif update_type == "metrics":
-            result = await updater.update_company_metrics(tickers=tickers_list, max_tickers=max_tickers)
-            print(f"Metrics update complete: {result}")
-        elif update_type == "history":
-            result = await updater.update_historical_prices(tickers=tickers_list, max_tickers=max_tickers, days=days)
-            print(f"Historical price update complete: {result}")
-        elif update_type == "smart":
-            result = await updater.smart_update(update_type="all", max_tickers=max_tickers)
-            print(f"Smart update complete: {result}")
-        elif update_type == "stale":  # Add this case
-            metrics_days = 7  # Default value
-            price_days = 1    # Default value
-            result = await updater.update_stale_securities(
-                metrics_days_threshold=metrics_days,
-                price_days_threshold=price_days,
-                max_metrics_tickers=max_tickers or 50,
-                max_prices_tickers=max_tickers or 100
-            )
-            print(f"Stale update complete: {result}")
-        else:
-            print(f"Unknown update type: {update_type}")
-            
-    except Exception as e:
-        print(f"Update failed: {str(e)}")
-
-# Update argument parser
-if __name__ == "__main__":
-    import argparse
-    
-    parser = argparse.ArgumentParser(description="NestEgg Market Data Updater")
-    parser.add_argument("--type", choices=["prices", "metrics", "history", "smart", "stale"], default="smart", help="Type of update to perform")
-    parser.add_argument("--max", type=int, help="Maximum number of tickers to process")
-    parser.add_argument("--tickers", type=str, help="Comma-separated list of tickers to update")
-    parser.add_argument("--days", type=int, default=30, help="Number of days of history to fetch (for history updates)")
-    parser.add_argument("--metrics-days", type=int, default=7, help="Days threshold for stale metrics")
-    parser.add_argument("--price-days", type=int, default=1, help="Days threshold for stale prices")
-    parser.add_argument("--batch-size", type=int, default=5, help="Batch size for API calls (for batched operations)")
-    
-    args = parser.parse_args()
-    
-    # Handle tickers argument
-    tickers_list = None
-    if args.tickers:
-        tickers_list = [ticker.strip().upper() for ticker in args.tickers.split(',')]
-    
-    # Pass the days parameter when calling run_price_update
-    if args.type == "history":
-        asyncio.run(run_price_update(args.type, args.max, tickers_list, days=args.days))
-    elif args.type == "stale":
-        # Special case for stale updates
-        updater = PriceUpdaterV2()
-        asyncio.run(updater.update_stale_securities(
-            metrics_days_threshold=args.metrics_days,
-            price_days_threshold=args.price_days,
-            max_metrics_tickers=args.max or 50,
-            max_prices_tickers=args.max or 100
-        ))
-    else:
+"""
+Enhanced price updater that uses multiple data sources and is decoupled from
+portfolio calculations.
+"""
+import os
+import sys
+import logging
+import asyncio
+import time
+import databases
+import sqlalchemy
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Set
+from dotenv import load_dotenv
+
+# uvloop dispatches socket I/O several times faster than the stdlib selector
+# loop, which benefits every HTTP fetch the updater fans out; purely optional
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+# Import our modules
+from api_clients.market_data_manager import MarketDataManager
+from utils.common import record_system_event, update_system_event
+from redis_cache import FastCache
+
+# Load environment variables
+load_dotenv()
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("price_updater_v2")
+
+# Initialize Database Connection
+DATABASE_URL = os.getenv("DATABASE_URL")
+database = databases.Database(DATABASE_URL)
+
+# Window for coalescing request_price_update calls into one batch
+PRICE_COALESCE_SECONDS = 2.0
+
+# How long smart_update ignores tickers it has already submitted, and the cap
+# on how many submissions it remembers
+SMART_UPDATE_COOLDOWN_SECONDS = 60
+RECENT_TICKERS_MAX = 5000
+
+# How long a just-written price satisfies other updater runs without a
+# refetch; aligned to the tightest scheduler cadence
+PRICE_CACHE_TTL_SECONDS = 60
+
+# Cap on individually logged row errors per fallback pass - a broken source
+# can fail every row, and thousands of identical lines help nobody
+ROW_ERROR_LOG_LIMIT = 10
+
+# Bound on concurrent company-metrics fetches. Per-request pacing below this
+# is owned by the source clients (the Polygon client runs its own semaphore
+# and rate limiter), so this only caps the fan-out on our side.
+METRICS_FETCH_CONCURRENCY = 20
+
+# Hot-path write statements, built once at import time. Constant query text
+# also lets the driver reuse prepared-statement plans across calls.
+#
+# Required indexes (there is no migration tooling in this repo, so verify
+# these exist before deploying the batched writes below):
+#
+#   securities: unique btree on (ticker) - every UPDATE here hits
+#       WHERE ticker = :ticker / ticker = ANY(:tickers)
+#   price_history: unique btree on (ticker, date) - backs the
+#       ON CONFLICT (ticker, date) upserts; adding
+#       INCLUDE (close_price, source) lets the no-op write guards resolve
+#       from the index without heap fetches
+#   securities: btree on (last_updated), (last_metrics_update),
+#       (last_backfilled) - serve the staleness ORDER BY ... LIMIT
+#       candidate queries in smart_update/update_stale_securities
+UPDATE_SECURITY_PRICE_POLYGON_SQL = """
+    UPDATE securities
+    SET
+        current_price = :price,
+        last_updated = :timestamp,
+        price_timestamp = :price_timestamp_str,
+        data_source = :source,
+        on_polygon = TRUE
+    WHERE ticker = :ticker
+"""
+
+UPSERT_PRICE_HISTORY_POLYGON_SQL = """
+    INSERT INTO price_history
+    (ticker, close_price, timestamp, date, source)
+    VALUES (:ticker, :price, :timestamp, :date, :source)
+    ON CONFLICT (ticker, date) DO UPDATE
+    SET close_price = EXCLUDED.close_price,
+        timestamp = EXCLUDED.timestamp,
+        source = EXCLUDED.source
+    WHERE price_history.close_price IS DISTINCT FROM EXCLUDED.close_price
+       OR price_history.source IS DISTINCT FROM EXCLUDED.source
+"""
+
+UPDATE_SECURITY_PRICE_YF_SQL = """
+    UPDATE securities
+    SET
+        current_price = :price,
+        last_updated = :timestamp,
+        price_timestamp = :price_timestamp,
+        day_open = :day_open,
+        day_high = :day_high,
+        day_low = :day_low,
+        volume = :volume,
+        data_source = :source
+    WHERE ticker = :ticker
+"""
+
+UPSERT_PRICE_HISTORY_YF_SQL = """
+    INSERT INTO price_history
+    (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, price_timestamp, source)
+    VALUES (:ticker, :price, :day_open, :day_high, :day_low, :volume, :timestamp, :date, :price_timestamp, :source)
+    ON CONFLICT (ticker, date) DO UPDATE
+    SET close_price = EXCLUDED.close_price,
+        day_open = EXCLUDED.day_open,
+        day_high = EXCLUDED.day_high,
+        day_low = EXCLUDED.day_low,
+        volume = EXCLUDED.volume,
+        timestamp = EXCLUDED.timestamp,
+        price_timestamp = EXCLUDED.price_timestamp,
+        source = EXCLUDED.source
+    WHERE price_history.close_price IS DISTINCT FROM EXCLUDED.close_price
+       OR price_history.day_open IS DISTINCT FROM EXCLUDED.day_open
+       OR price_history.day_high IS DISTINCT FROM EXCLUDED.day_high
+       OR price_history.day_low IS DISTINCT FROM EXCLUDED.day_low
+       OR price_history.volume IS DISTINCT FROM EXCLUDED.volume
+       OR price_history.source IS DISTINCT FROM EXCLUDED.source
+"""
+
+UPSERT_PRICE_HISTORY_SQL = """
+    INSERT INTO price_history
+    (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, source)
+    VALUES (:ticker, :close_price, :day_open, :day_high, :day_low, :volume, :timestamp, :date, :source)
+    ON CONFLICT (ticker, date) DO UPDATE
+    SET
+        close_price = EXCLUDED.close_price,
+        day_open = EXCLUDED.day_open,
+        day_high = EXCLUDED.day_high,
+        day_low = EXCLUDED.day_low,
+        volume = EXCLUDED.volume,
+        timestamp = EXCLUDED.timestamp,
+        source = EXCLUDED.source
+    WHERE price_history.close_price IS DISTINCT FROM EXCLUDED.close_price
+       OR price_history.day_open IS DISTINCT FROM EXCLUDED.day_open
+       OR price_history.day_high IS DISTINCT FROM EXCLUDED.day_high
+       OR price_history.day_low IS DISTINCT FROM EXCLUDED.day_low
+       OR price_history.volume IS DISTINCT FROM EXCLUDED.volume
+       OR price_history.source IS DISTINCT FROM EXCLUDED.source
+"""
+
+UPDATE_LAST_BACKFILLED_SQL = """
+    UPDATE securities
+    SET last_backfilled = :timestamp
+    WHERE ticker = ANY(:tickers)
+"""
+
+# Remaining statements, hoisted for the same reason. The metrics UPDATE in
+# particular used to be rebuilt inside the per-ticker loop.
+SELECT_ACTIVE_TICKERS_SQL = """
+    SELECT ticker
+    FROM securities
+    WHERE active = true
+"""
+
+MARK_UNAVAILABLE_SQL = """
+    UPDATE securities
+    SET on_yfinance = false
+    WHERE ticker = ANY(:tickers)
+"""
+
+SELECT_TICKER_SOURCES_SQL = """
+    SELECT
+        ticker,
+        on_yfinance,
+        on_polygon
+    FROM securities
+    WHERE ticker = ANY(:tickers)
+    AND active = true
+"""
+
+SELECT_ALL_TICKER_SOURCES_SQL = """
+    SELECT
+        ticker,
+        on_yfinance,
+        on_polygon
+    FROM securities
+    WHERE active = true
+"""
+
+MARK_NOT_ON_POLYGON_SQL = """
+    UPDATE securities SET on_polygon = FALSE WHERE ticker = ANY(:tickers)
+"""
+
+SELECT_METRICS_TICKERS_SQL = """
+    SELECT ticker
+    FROM securities
+    WHERE ticker = ANY(:tickers)
+    AND (
+        (on_yfinance IS NULL OR on_yfinance = true)
+        OR
+        (on_polygon IS NULL OR on_polygon = true)
+    )
+"""
+
+SELECT_ACTIVE_METRICS_TICKERS_SQL = """
+    SELECT ticker
+    FROM securities
+    WHERE active = true
+    AND (
+        (on_yfinance IS NULL OR on_yfinance = true)
+        OR
+        (on_polygon IS NULL OR on_polygon = true)
+    )
+"""
+
+MARK_METRICS_MISSING_SQL = """
+    UPDATE securities
+    SET
+        on_yfinance = FALSE,
+        last_metrics_update = NOW()
+    WHERE ticker = ANY(:tickers)
+"""
+
+UPDATE_SECURITY_METRICS_SQL = """
+    UPDATE securities
+    SET
+        company_name = CAST(:company_name AS VARCHAR),
+        sector = CAST(:sector AS VARCHAR),
+        industry = CAST(:industry AS VARCHAR),
+        market_cap = CAST(:market_cap AS NUMERIC),
+        current_price = CAST(:current_price AS NUMERIC),
+        previous_close = CAST(:previous_close AS NUMERIC),
+        day_open = CAST(:day_open AS NUMERIC),
+        day_low = CAST(:day_low AS NUMERIC),
+        day_high = CAST(:day_high AS NUMERIC),
+        volume = CAST(:volume AS BIGINT),
+        average_volume = CAST(:average_volume AS BIGINT),
+        pe_ratio = CAST(:pe_ratio AS NUMERIC),
+        forward_pe = CAST(:forward_pe AS NUMERIC),
+        dividend_rate = CAST(:dividend_rate AS NUMERIC),
+        dividend_yield = CAST(:dividend_yield AS NUMERIC),
+        target_high_price = CAST(:target_high_price AS NUMERIC),
+        target_low_price = CAST(:target_low_price AS NUMERIC),
+        target_mean_price = CAST(:target_mean_price AS NUMERIC),
+        target_median_price = CAST(:target_median_price AS NUMERIC),
+        beta = CAST(:beta AS NUMERIC),
+        fifty_two_week_low = CAST(:fifty_two_week_low AS NUMERIC),
+        fifty_two_week_high = CAST(:fifty_two_week_high AS NUMERIC),
+        fifty_two_week_range = CAST(:fifty_two_week_range AS TEXT),
+        eps = CAST(:eps AS NUMERIC),
+        forward_eps = CAST(:forward_eps AS NUMERIC),
+        bid_price = CAST(:bid_price AS NUMERIC),
+        ask_price = CAST(:ask_price AS NUMERIC),
+        last_metrics_update = CAST(:timestamp AS TIMESTAMP),
+        metrics_source = CAST(:source AS VARCHAR),
+        on_yfinance = CASE WHEN :source = 'yahoo_finance' THEN TRUE ELSE on_yfinance END
+    WHERE ticker = :ticker
+"""
+
+SELECT_EXISTING_TICKERS_SQL = """
+    SELECT ticker
+    FROM securities
+    WHERE ticker = ANY(:tickers)
+"""
+
+SMART_UPDATE_CANDIDATES_SQL = """
+    WITH price_candidates AS (
+        SELECT ticker, 'prices' AS kind
+        FROM securities
+        WHERE active = true AND on_yfinance = true
+        ORDER BY COALESCE(last_updated, '1970-01-01') ASC
+        LIMIT :price_limit
+    ),
+    metrics_candidates AS (
+        SELECT ticker, 'metrics' AS kind
+        FROM securities
+        WHERE active = true AND on_yfinance = true
+        ORDER BY COALESCE(last_metrics_update, '1970-01-01') ASC
+        LIMIT :metrics_limit
+    ),
+    history_candidates AS (
+        SELECT ticker, 'history' AS kind
+        FROM securities
+        WHERE active = true AND on_yfinance = true
+        ORDER BY COALESCE(last_backfilled, '1970-01-01') ASC
+        LIMIT :history_limit
+    )
+    SELECT ticker, kind FROM price_candidates
+    UNION ALL SELECT ticker, kind FROM metrics_candidates
+    UNION ALL SELECT ticker, kind FROM history_candidates
+"""
+
+STALE_METRICS_TICKERS_SQL = """
+    SELECT ticker
+    FROM securities
+    WHERE active = true
+    AND (
+        last_metrics_update IS NULL
+        OR last_metrics_update < NOW() - INTERVAL '1 days' * :days
+    )
+    ORDER BY COALESCE(last_metrics_update, '1970-01-01') ASC
+    LIMIT :limit
+"""
+
+STALE_PRICE_TICKERS_SQL = """
+    SELECT ticker
+    FROM securities
+    WHERE active = true
+    AND (
+        last_updated IS NULL
+        OR last_updated < NOW() - INTERVAL '1 days' * :days
+    )
+    ORDER BY COALESCE(last_updated, '1970-01-01') ASC
+    LIMIT :limit
+"""
+
+# Shared MarketDataManager, created on first use. The API layer constructs a
+# fresh PriceUpdaterV2 per request, so without this every request would stand
+# up new source clients (and their HTTP sessions) from scratch.
+_market_data: Optional[MarketDataManager] = None
+
+
+def get_market_data() -> MarketDataManager:
+    """Return the process-wide MarketDataManager, creating it on first call"""
+    global _market_data
+    if _market_data is None:
+        _market_data = MarketDataManager()
+    return _market_data
+
+
+class PriceUpdaterV2:
+    """
+    Enhanced price updater that uses multiple data sources.
+    This is decoupled from portfolio calculations.
+    """
+
+    def __init__(self):
+        """Initialize the price updater with necessary clients"""
+        self.database = database
+        self.market_data = get_market_data()
+
+        # State for request_price_update coalescing
+        self._pending_tickers = set()
+        self._drain_task = None
+
+        # Tickers recently submitted by smart_update, ticker -> monotonic time
+        self._recently_submitted = {}
+
+        # In-flight background event writes, awaited on disconnect
+        self._background_tasks = set()
+
+        # Last price written per ticker, ticker -> (price, date). The price
+        # APIs we use don't serve ETags, so this is the conditional-fetch
+        # equivalent on our side: a refetch that returns the same price for
+        # the same day skips the DB round-trip entirely.
+        self._last_prices = {}
+    
+    async def connect(self):
+        """Connect to the database (no-op if the shared pool is already up)"""
+        if not self.database.is_connected:
+            await self.database.connect()
+
+    async def disconnect(self):
+        """
+        Disconnect from the database
+
+        The update methods deliberately never call this: the module-level pool
+        stays warm for the life of the process so repeated updates don't pay
+        the TCP/auth handshake each time. Only process-level entry points
+        (the CLI runner, an app shutdown hook) should tear it down.
+        """
+        # Let background event writes land before closing the pool
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+        if self.database.is_connected:
+            await self.database.disconnect()
+
+    def _record_completion(self, event_id, payload) -> None:
+        """
+        Record a completion event without blocking the caller's return
+
+        The write is fired as a background task - the result doesn't gate the
+        update outcome, so callers shouldn't wait a DB round-trip for it.
+        disconnect() awaits anything still in flight.
+        """
+        task = asyncio.create_task(
+            update_system_event(self.database, event_id, "completed", payload)
+        )
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def get_active_tickers(self) -> List[str]:
+        """
+        Get all active tickers from the database
+        
+        Returns:
+            List of active ticker symbols
+        """
+        # Activation changes are rare, so a short-TTL cache saves a securities
+        # scan when several updaters run back to back
+        cached = FastCache.get("securities:active")
+        if cached is not None:
+            return cached
+
+        result = await self.database.fetch_all(SELECT_ACTIVE_TICKERS_SQL)
+        tickers = [row['ticker'] for row in result]
+
+        FastCache.set("securities:active", tickers, expire_seconds=120)
+        return tickers
+    
+    async def mark_ticker_unavailable(self, tickers) -> None:
+        """
+        Mark one or more tickers as unavailable in a single UPDATE
+
+        Args:
+            tickers: Ticker symbol or list of ticker symbols to mark as unavailable
+        """
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        if not tickers:
+            return
+
+        await self.database.execute(MARK_UNAVAILABLE_SQL, {"tickers": list(tickers)})
+        FastCache.delete("securities:active")
+        logger.warning(f"Marked {len(tickers)} tickers as unavailable: {', '.join(tickers)}")
+
+    async def request_price_update(self, tickers) -> Dict[str, Any]:
+        """
+        Queue tickers for a coalesced price update
+
+        Callers that trigger updates for small ticker sets in quick succession
+        share one batch: requests arriving within PRICE_COALESCE_SECONDS are
+        merged, duplicate tickers collapse into a single fetch, and every
+        caller gets the result of the shared run. Use update_security_prices
+        directly when an immediate, dedicated update is needed.
+
+        Args:
+            tickers: Ticker symbol or list of ticker symbols to update
+
+        Returns:
+            Summary of the shared update run
+        """
+        if isinstance(tickers, str):
+            tickers = [tickers]
+
+        self._pending_tickers.update(tickers)
+
+        # The drain task clears itself when it snapshots the pending set, so
+        # if it's still set here our tickers are guaranteed to be included
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.create_task(self._drain_price_requests())
+
+        return await asyncio.shield(self._drain_task)
+
+    async def _drain_price_requests(self) -> Dict[str, Any]:
+        """Wait out the coalescing window, then run one shared price update"""
+        await asyncio.sleep(PRICE_COALESCE_SECONDS)
+
+        batch = list(self._pending_tickers)
+        self._pending_tickers.clear()
+        # Requests arriving after this point start a new window
+        self._drain_task = None
+
+        logger.info(f"Coalesced price update for {len(batch)} tickers")
+        return await self.update_security_prices(tickers=batch)
+
+    async def serve(self, interval_seconds: int = 300, max_tickers=None) -> None:
+        """
+        Run smart updates on a fixed interval for the life of the process
+
+        Unlike cron-style one-shot invocations, the updater instance, its
+        market-data clients and the shared database pool all stay alive
+        between runs, so repeated updates skip connection setup entirely.
+
+        Args:
+            interval_seconds: Delay between smart update runs
+            max_tickers: Maximum number of tickers per operation per run
+        """
+        logger.info(f"Starting update daemon: smart update every {interval_seconds}s")
+        await self.connect()
+
+        try:
+            while True:
+                try:
+                    await self.smart_update(update_type="all", max_tickers=max_tickers)
+                except Exception as e:
+                    # Keep the daemon alive; the failure is already recorded
+                    # in system_events by smart_update
+                    logger.error(f"Daemon update run failed: {str(e)}")
+
+                await asyncio.sleep(interval_seconds)
+        finally:
+            await self.disconnect()
+
+    async def _pipeline_price_writes(self, source, tickers, make_rows,
+                                     update_sql, upsert_sql, fetch_chunk_size=50):
+        """
+        Overlap market-data fetches with DB writes for one source
+
+        A producer task fetches prices chunk by chunk and enqueues the
+        results; the consumer drains the queue and flushes each chunk's rows
+        in one transaction, so wall clock approaches max(fetch, write)
+        instead of their sum.
+
+        Args:
+            source: Market data source client
+            tickers: Tickers to fetch from this source
+            make_rows: Callable mapping (ticker, data, now, today) to a
+                (security_row, history_row) pair, or None to skip the ticker
+            update_sql: Statement for the securities executemany flush
+            upsert_sql: Statement for the price_history executemany flush
+            fetch_chunk_size: Tickers per get_batch_prices call
+
+        Returns:
+            Tuple of (tickers written, tickers skipped as unchanged)
+        """
+        queue = asyncio.Queue(maxsize=4)
+        written = set()
+        unchanged = set()
+
+        async def producer():
+            for i in range(0, len(tickers), fetch_chunk_size):
+                chunk = tickers[i:i + fetch_chunk_size]
+                try:
+                    await queue.put(await source.get_batch_prices(chunk))
+                except Exception as fetch_error:
+                    logger.error(f"Error fetching prices for chunk starting at {chunk[0]}: {str(fetch_error)}")
+            await queue.put(None)
+
+        producer_task = asyncio.create_task(producer())
+
+        while True:
+            results = await queue.get()
+            if results is None:
+                break
+
+            # One clock read per chunk keeps its rows on one timestamp
+            now = datetime.utcnow()
+            today = now.date()
+            security_rows = []
+            history_rows = []
+            rejected = 0
+
+            for ticker, data in results.items():
+                # Validate up front rather than paying a try/except per row
+                if data.get("price") is None:
+                    rejected += 1
+                    continue
+                # Same price for the same day as the last write: nothing to
+                # store, so don't pay the round-trip
+                if self._last_prices.get(ticker) == (data["price"], today):
+                    unchanged.add(ticker)
+                    continue
+                rows = make_rows(ticker, data, now, today)
+                if rows is None:
+                    continue
+                security_row, history_row = rows
+                security_rows.append(security_row)
+                history_rows.append(history_row)
+
+            if rejected:
+                logger.warning(f"Dropped {rejected} price rows with no price from this chunk")
+
+            if security_rows:
+                try:
+                    # One transaction per flush: a single commit/WAL sync
+                    # instead of one per statement
+                    async with self.database.transaction():
+                        await self.database.execute_many(update_sql, security_rows)
+                        await self.database.execute_many(upsert_sql, history_rows)
+                    for row in security_rows:
+                        written.add(row["ticker"])
+                        self._last_prices[row["ticker"]] = (row["price"], today)
+                except Exception as flush_error:
+                    # Retry row by row so one bad row doesn't discard the chunk
+                    logger.error("Bulk price flush failed, retrying row by row: %s", flush_error)
+                    row_errors = 0
+                    for security_row, history_row in zip(security_rows, history_rows):
+                        try:
+                            await self.database.execute(update_sql, security_row)
+                            await self.database.execute(upsert_sql, history_row)
+                            written.add(security_row["ticker"])
+                            self._last_prices[security_row["ticker"]] = (security_row["price"], today)
+                        except Exception as row_error:
+                            row_errors += 1
+                            if row_errors <= ROW_ERROR_LOG_LIMIT:
+                                logger.error("Error writing price row for %s: %s", security_row["ticker"], row_error)
+                    if row_errors > ROW_ERROR_LOG_LIMIT:
+                        logger.error("Suppressed %d further price row errors in this chunk", row_errors - ROW_ERROR_LOG_LIMIT)
+
+            # Entries from previous days can't match again; drop them once the
+            # map outgrows its bound
+            if len(self._last_prices) > RECENT_TICKERS_MAX:
+                self._last_prices = {
+                    ticker: entry
+                    for ticker, entry in self._last_prices.items()
+                    if entry[1] == today
+                }
+
+        await producer_task
+        return written, unchanged
+    
+# In price_updater_v2.py - update_security_prices method
+
+    async def update_security_prices(self, tickers=None, max_tickers=None) -> Dict[str, Any]:
+            """
+            Update current prices for securities using multiple data sources
+            
+            Args:
+                tickers: Optional list of specific tickers to update
+                max_tickers: Maximum number of tickers to update (for testing)
+                
+            Returns:
+                Summary of updates made
+            """
+            try:
+                await self.connect()
+                
+                # Record the start of this operation
+                event_id = await record_system_event(
+                    self.database, 
+                    "price_update", 
+                    "started", 
+                    {"source": "multiple", "tickers": tickers}
+                )
+                
+                # Start timing
+                start_time = time.perf_counter()
+                
+                # Get tickers with source availability info. The ticker list
+                # is bound as a single array parameter so the query text is
+                # stable (plan cache friendly) and ticker values are never
+                # interpolated into SQL.
+                if tickers:
+                    ticker_data = await self.database.fetch_all(
+                        SELECT_TICKER_SOURCES_SQL, {"tickers": list(tickers)}
+                    )
+                else:
+                    ticker_data = await self.database.fetch_all(SELECT_ALL_TICKER_SOURCES_SQL)
+                
+                # Organize tickers by preferred data source
+                polygon_tickers = []
+                yfinance_tickers = []
+                unavailable_tickers = []
+                
+                for row in ticker_data:
+                    ticker = row["ticker"]
+                    # Check Polygon first (preferred source)
+                    if row["on_polygon"] is None or row["on_polygon"] == True:
+                        polygon_tickers.append(ticker)
+                    # Then check Yahoo Finance
+                    elif row["on_yfinance"] is None or row["on_yfinance"] == True:
+                        yfinance_tickers.append(ticker)
+                    else:
+                        # Ticker isn't available on any source
+                        unavailable_tickers.append(ticker)
+                
+                # Apply max_tickers limit if specified
+                all_available_tickers = polygon_tickers + yfinance_tickers
+                if max_tickers and len(all_available_tickers) > max_tickers:
+                    # Maintain the source priority when limiting
+                    total_to_process = max_tickers
+                    polygon_count = min(len(polygon_tickers), total_to_process)
+                    yfinance_count = min(len(yfinance_tickers), total_to_process - polygon_count)
+                    
+                    polygon_tickers = polygon_tickers[:polygon_count]
+                    yfinance_tickers = yfinance_tickers[:yfinance_count]
+
+                # Skip tickers whose price another run wrote within the shared
+                # cache TTL - when the scheduler fires faster than prices
+                # meaningfully change, this cuts the upstream fetches to the
+                # tickers that actually aged out
+                cache_hits = 0
+                if FastCache.is_available() and (polygon_tickers or yfinance_tickers):
+                    cached = FastCache.get_many(
+                        [f"shared:price:{t}" for t in polygon_tickers + yfinance_tickers]
+                    )
+                    if cached:
+                        polygon_tickers = [t for t in polygon_tickers if f"shared:price:{t}" not in cached]
+                        yfinance_tickers = [t for t in yfinance_tickers if f"shared:price:{t}" not in cached]
+                        cache_hits = len(cached)
+                        logger.info(f"Skipping {cache_hits} tickers with cache-fresh prices")
+
+                logger.info(f"Processing {len(polygon_tickers)} tickers with Polygon and {len(yfinance_tickers)} with Yahoo Finance")
+                logger.info(f"Skipping {len(unavailable_tickers)} unavailable tickers")
+                
+                # Track statistics
+                update_count = 0
+                unchanged_count = 0
+                polygon_success = 0
+                yfinance_success = 0
+                sources_used = set()
+                processed_tickers = set()
+                failed_tickers = []
+                
+                # Try Polygon tickers first
+                if polygon_tickers:
+                    logger.info(f"Fetching prices from Polygon for {len(polygon_tickers)} tickers")
+                    polygon_source = self.market_data.sources.get("polygon")
+                    
+                    if polygon_source:
+                        sources_used.add("polygon")
+
+                        def polygon_rows(ticker, data, now, today):
+                            return (
+                                {
+                                    "ticker": ticker,
+                                    "price": data["price"],
+                                    "timestamp": now,
+                                    "price_timestamp_str": data.get("price_timestamp_str"),
+                                    "source": "polygon"
+                                },
+                                {
+                                    "ticker": ticker,
+                                    "price": data["price"],
+                                    "timestamp": now,
+                                    "date": today,
+                                    "source": "polygon"
+                                }
+                            )
+
+                        polygon_written, polygon_unchanged = await self._pipeline_price_writes(
+                            polygon_source, polygon_tickers, polygon_rows,
+                            UPDATE_SECURITY_PRICE_POLYGON_SQL,
+                            UPSERT_PRICE_HISTORY_POLYGON_SQL
+                        )
+
+                        # Unchanged tickers count as processed so they aren't
+                        # retried against Yahoo Finance below
+                        processed_tickers.update(polygon_written, polygon_unchanged)
+                        polygon_success = len(polygon_written)
+                        update_count += polygon_success
+                        unchanged_count += len(polygon_unchanged)
+
+                        # Identify failed Polygon tickers to try with Yahoo Finance
+                        failed_polygon_tickers = [t for t in polygon_tickers if t not in processed_tickers]
+                        logger.info(f"{len(failed_polygon_tickers)} tickers failed with Polygon, adding to Yahoo Finance queue")
+                        
+                        # Mark tickers not found on Polygon in one round trip
+                        if failed_polygon_tickers:
+                            await self.database.execute(
+                                MARK_NOT_ON_POLYGON_SQL,
+                                {"tickers": failed_polygon_tickers}
+                            )
+
+
+                        # Add failed Polygon tickers to Yahoo Finance queue if they're not already known to be unavailable
+                        yfinance_tickers.extend(failed_polygon_tickers)
+                
+                # Process Yahoo Finance tickers
+                if yfinance_tickers:
+                    logger.info(f"Fetching prices from Yahoo Finance for {len(yfinance_tickers)} tickers")
+                    yf_source = self.market_data.sources.get("yahoo_finance")
+                    
+                    if yf_source:
+                        sources_used.add("yahoo_finance")
+
+                        def yfinance_rows(ticker, data, now, today):
+                            # Skip if we already processed this ticker with Polygon
+                            if ticker in processed_tickers:
+                                return None
+
+                            return (
+                                {
+                                    "ticker": ticker,
+                                    "price": data["price"],
+                                    "timestamp": now,
+                                    "price_timestamp": data.get("price_timestamp"),
+                                    "day_open": data.get("day_open"),
+                                    "day_high": data.get("day_high"),
+                                    "day_low": data.get("day_low"),
+                                    "volume": data.get("volume"),
+                                    "source": "yahoo_finance"
+                                },
+                                {
+                                    "ticker": ticker,
+                                    "price": data["price"],
+                                    "day_open": data.get("day_open"),
+                                    "day_high": data.get("day_high"),
+                                    "day_low": data.get("day_low"),
+                                    "volume": data.get("volume"),
+                                    "timestamp": now,
+                                    "date": today,
+                                    "price_timestamp": data.get("price_timestamp"),
+                                    "source": "yahoo_finance"
+                                }
+                            )
+
+                        # Don't set on_yfinance=FALSE on timeout
+                        yfinance_written, yfinance_unchanged = await self._pipeline_price_writes(
+                            yf_source, yfinance_tickers, yfinance_rows,
+                            UPDATE_SECURITY_PRICE_YF_SQL,
+                            UPSERT_PRICE_HISTORY_YF_SQL
+                        )
+
+                        processed_tickers.update(yfinance_written, yfinance_unchanged)
+                        yfinance_success = len(yfinance_written)
+                        update_count += yfinance_success
+                        unchanged_count += len(yfinance_unchanged)
+
+                        # Identify failed Yahoo Finance tickers
+                        failed_yf_tickers = [t for t in yfinance_tickers if t not in processed_tickers]
+                        
+                        # Don't automatically mark as unavailable - YF timeouts shouldn't be treated as "not found"
+                        failed_tickers.extend(failed_yf_tickers)
+                        logger.warning(f"{len(failed_yf_tickers)} tickers failed with Yahoo Finance")
+                
+                # Calculate duration
+                duration = time.perf_counter() - start_time
+                
+                # Record completion
+                result = {
+                    "total_tickers_evaluated": len(ticker_data),
+                    "unavailable_tickers_count": len(unavailable_tickers),
+                    "updated_count": update_count,
+                    "unchanged_count": unchanged_count,
+                    "cache_hits": cache_hits,
+                    "polygon_success": polygon_success,
+                    "yfinance_success": yfinance_success,
+                    "failed_tickers_count": len(failed_tickers),
+                    "sources_used": list(sources_used),
+                    "duration_seconds": duration
+                }
+                
+                self._record_completion(event_id, result)
+                
+                logger.info(f"Price update completed: {update_count} tickers updated in {duration:.2f} seconds")
+                logger.info(f"Sources used: {', '.join(sources_used)}")
+                logger.info(f"Polygon: {polygon_success} tickers, Yahoo Finance: {yfinance_success} tickers")
+                
+                # After successful update, invalidate relevant caches
+                if FastCache.is_available():
+                    # Invalidate cached portfolio calculations by bumping the
+                    # namespace version - one INCR instead of a keyspace SCAN
+                    FastCache.incr("portfolio:ver")
+
+                    # Invalidate cached security data for processed tickers in
+                    # one pipelined round-trip, plus the securities list
+                    keys = [f"security:{ticker}" for ticker in processed_tickers]
+                    keys.extend(["securities:all", "securities:active"])
+                    FastCache.delete_many(keys)
+
+                    # History caches keyed security_history:{ticker}:... - one
+                    # SCAN covers them all (the old per-ticker delete calls
+                    # passed globs to DEL, which never matched anything)
+                    if processed_tickers:
+                        FastCache.delete_pattern("security_history:*")
+
+                    # Publish the prices just written so other runs within the
+                    # TTL skip refetching them
+                    fresh_prices = {
+                        f"shared:price:{ticker}": self._last_prices[ticker][0]
+                        for ticker in processed_tickers
+                        if ticker in self._last_prices
+                    }
+                    if fresh_prices:
+                        FastCache.set_many(fresh_prices, PRICE_CACHE_TTL_SECONDS)
+
+                    logger.info(f"Invalidated cache for {len(processed_tickers)} securities")
+                
+                return result
+                
+            except Exception as e:
+                logger.error(f"Error updating security prices: {str(e)}")
+                
+                # Record failure
+                if 'event_id' in locals() and event_id:
+                    await update_system_event(
+                        self.database,
+                        event_id,
+                        "failed",
+                        {"error": str(e)},
+                        str(e)
+                    )
+                
+                raise
+
+    async def update_company_metrics(self, tickers=None, max_tickers=None) -> Dict[str, Any]:
+        try:
+            await self.connect()
+            
+            # Record the start of this operation
+            event_id = await record_system_event(
+                self.database, 
+                "metrics_update", 
+                "started", 
+                {"tickers": tickers}
+            )
+            
+            # Start timing
+            start_time = time.perf_counter()
+            
+            # Get active tickers
+            if tickers:
+                result = await self.database.fetch_all(
+                    SELECT_METRICS_TICKERS_SQL, {"tickers": list(tickers)}
+                )
+                all_tickers = [row['ticker'] for row in result]
+
+                # One set plus a membership sweep instead of two throwaway sets
+                found = set(all_tickers)
+                missing_tickers = [t for t in tickers if t not in found]
+                if missing_tickers:
+                    logger.warning("Tickers not found in database or unavailable on all sources: %s", missing_tickers)
+            else:
+                result = await self.database.fetch_all(SELECT_ACTIVE_METRICS_TICKERS_SQL)
+                all_tickers = [row['ticker'] for row in result]
+            
+            # Apply max_tickers limit if specified
+            if max_tickers and len(all_tickers) > max_tickers:
+                selected_tickers = all_tickers[:max_tickers]
+            else:
+                selected_tickers = all_tickers
+                
+            logger.info(f"Updating metrics for {len(selected_tickers)} securities")
+            
+            # Track statistics
+            update_count = 0
+            unavailable_count = 0
+            not_found_tickers = []  # Track tickers not found on any source
+            sources_used = set()
+            updated_tickers = set()
+            
+            # Fetch metrics through the manager's batch API - one vectorized
+            # call that owns the concurrency bound and per-source fan-out
+            metrics_by_ticker = await self.market_data.get_batch_company_metrics(
+                selected_tickers, max_concurrent=METRICS_FETCH_CONCURRENCY
+            )
+
+            # Tickers confirmed missing on all sources, marked in one UPDATE below
+            confirmed_missing = []
+
+            # (ticker, params) rows pending one batched securities UPDATE
+            metrics_rows = []
+
+            # One clock read for the whole result set
+            fetch_completed_at = datetime.now(timezone.utc)
+
+            # Process fetched results (DB writes stay sequential)
+            for ticker, metrics in metrics_by_ticker.items():
+                try:
+                    # Check if metrics are completely unavailable
+                    if not metrics or metrics.get("not_found"):
+                        logger.warning("No metrics available for %s", ticker)
+                        unavailable_count += 1
+                        not_found_tickers.append(ticker)
+                        confirmed_missing.append(ticker)
+                        continue
+
+                    # Prepare update dictionary with type conversion and safe casting
+                    update_data = {
+                        "ticker": ticker,
+                        "company_name": str(metrics.get("company_name", ""))[:255],
+                        "sector": str(metrics.get("sector", ""))[:100],
+                        "industry": str(metrics.get("industry", ""))[:100],
+                        "market_cap": metrics.get("market_cap"),
+                        "current_price": metrics.get("current_price"),
+                        "previous_close": metrics.get("previous_close"),
+                        "day_open": metrics.get("day_open"),
+                        "day_low": metrics.get("day_low"),
+                        "day_high": metrics.get("day_high"),
+                        "volume": metrics.get("volume"),
+                        "average_volume": metrics.get("average_volume"),
+                        "pe_ratio": metrics.get("pe_ratio"),
+                        "forward_pe": metrics.get("forward_pe"),
+                        "dividend_rate": metrics.get("dividend_rate"),
+                        "dividend_yield": metrics.get("dividend_yield"),
+                        "target_high_price": metrics.get("target_high_price"),
+                        "target_low_price": metrics.get("target_low_price"),
+                        "target_mean_price": metrics.get("target_mean_price"),
+                        "beta": metrics.get("beta"),
+                        "fifty_two_week_low": metrics.get("fifty_two_week_low"),
+                        "fifty_two_week_high": metrics.get("fifty_two_week_high"),
+                        "market_cap": metrics.get("market_cap"),
+                        "timestamp": fetch_completed_at,
+                        "source": metrics.get("source", "unknown"),
+                        "eps": metrics.get("eps"),
+                        "forward_eps": metrics.get("forward_eps"),
+                        "fifty_two_week_range": metrics.get("fifty_two_week_range"),
+                        "target_median_price": metrics.get("target_median_price"),
+                        "bid_price": metrics.get("bid_price"),
+                        "ask_price": metrics.get("ask_price")
+                    }
+                    
+                    # Type-safe column mapping with conversion
+                    column_mapping = {
+                        "current_price": ("current_price", float),
+                        "previous_close": ("previous_close", float),
+                        "day_open": ("day_open", float),
+                        "day_low": ("day_low", float), 
+                        "day_high": ("day_high", float),
+                        "volume": ("volume", int),
+                        "average_volume": ("average_volume", int),
+                        "pe_ratio": ("pe_ratio", float),
+                        "forward_pe": ("forward_pe", float),
+                        "dividend_rate": ("dividend_rate", float),
+                        "dividend_yield": ("dividend_yield", float),
+                        "target_high_price": ("target_high_price", float),
+                        "target_low_price": ("target_low_price", float),
+                        "target_mean_price": ("target_mean_price", float),
+                        "beta": ("beta", float),
+                        "fifty_two_week_low": ("fifty_two_week_low", float),
+                        "fifty_two_week_high": ("fifty_two_week_high", float),
+                        "eps": ("eps", float),
+                        "forward_eps": ("forward_eps", float),
+                        "bid_price": ("bid_price", float),
+                        "ask_price": ("ask_price", float),
+                        "target_median_price": ("target_median_price", float),
+                        "fifty_two_week_range": ("fifty_two_week_range", str)
+                    }
+                    
+                    for key in ['market_cap', 'target_mean_price']:
+                        if key in update_data and update_data[key] is not None:
+                            try:
+                                update_data[key] = float(update_data[key])
+                            except (ValueError, TypeError):
+                                logger.warning("Could not convert %s for %s", key, ticker)
+                                # Set to None if conversion fails
+                                update_data[key] = None
+                    
+                    # Add columns to update with type conversion
+                    for metric_key, (db_column, conversion_func) in column_mapping.items():
+                        if metric_key in metrics and metrics[metric_key] is not None:
+                            try:
+                                update_data[db_column] = conversion_func(metrics[metric_key])
+                            except (ValueError, TypeError):
+                                logger.warning("Could not convert %s for %s", metric_key, ticker)
+                                
+                    # Add this right before executing the database query
+                    if "timestamp" in update_data and update_data["timestamp"] is not None:
+                        if update_data["timestamp"].tzinfo is not None:
+                            # Remove timezone info for PostgreSQL
+                            update_data["timestamp"] = update_data["timestamp"].replace(tzinfo=None)
+                    
+                    # Debug-only: rendering the full dict per ticker is
+                    # expensive, so keep it below the default level
+                    logger.debug("Update data for %s: %s", ticker, update_data)
+
+                    # Queue for the batched flush below
+                    metrics_rows.append((ticker, update_data))
+
+                except Exception as e:
+                    logger.error("Error updating metrics for %s: %s", ticker, e)
+                    logger.debug("Problematic metrics: %s", metrics)
+                    unavailable_count += 1
+                    not_found_tickers.append(ticker)
+
+            # Flush all metrics updates in one executemany round instead of a
+            # round trip per ticker; retry row by row if the batch fails so one
+            # bad row doesn't discard the rest
+            if metrics_rows:
+                try:
+                    async with self.database.transaction():
+                        await self.database.execute_many(
+                            UPDATE_SECURITY_METRICS_SQL,
+                            [params for _, params in metrics_rows]
+                        )
+                    written = [ticker for ticker, _ in metrics_rows]
+                except Exception as flush_error:
+                    logger.error("Bulk metrics flush failed, retrying row by row: %s", flush_error)
+                    written = []
+                    row_errors = 0
+                    for ticker, params in metrics_rows:
+                        try:
+                            await self.database.execute(UPDATE_SECURITY_METRICS_SQL, params)
+                            written.append(ticker)
+                        except Exception as row_error:
+                            row_errors += 1
+                            if row_errors <= ROW_ERROR_LOG_LIMIT:
+                                logger.error("Error updating metrics for %s: %s", ticker, row_error)
+                            unavailable_count += 1
+                            not_found_tickers.append(ticker)
+                    if row_errors > ROW_ERROR_LOG_LIMIT:
+                        logger.error("Suppressed %d further metrics row errors", row_errors - ROW_ERROR_LOG_LIMIT)
+
+                updated_tickers.update(written)
+                update_count += len(written)
+
+            # Mark tickers confirmed missing on all sources in a single UPDATE
+            if confirmed_missing:
+                await self.database.execute(
+                    MARK_METRICS_MISSING_SQL, {"tickers": confirmed_missing}
+                )
+
+            # Create comprehensive result
+            result = {
+                "total_tickers": len(selected_tickers),
+                "updated_count": update_count,
+                "unavailable_count": unavailable_count,
+                "not_found_tickers": not_found_tickers,
+                "updated_tickers": list(updated_tickers),
+                "duration_seconds": time.perf_counter() - start_time
+            }
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Comprehensive error updating metrics: {str(e)}")
+            raise
+
+    async def update_historical_prices(self, tickers=None, max_tickers=None, days=30, batch_size=5) -> Dict[str, Any]:
+        """
+        Update historical prices for securities with batch processing
+        
+        Args:
+            tickers: Optional list of specific tickers to update
+            max_tickers: Maximum number of tickers to update (for testing)
+            days: Number of days of history to fetch
+            batch_size: Size of batches for API calls
+            
+        Returns:
+            Summary of updates made
+        """
+        try:
+            await self.connect()
+            
+            # Record the start of this operation
+            event_id = await record_system_event(
+                self.database, 
+                "history_update", 
+                "started", 
+                {"days": days, "tickers": tickers, "batch_size": batch_size}
+            )
+            
+            # Start timing
+            start_time = time.perf_counter()
+            
+            # Get tickers to update
+            if tickers:
+                # If specific tickers provided, validate they exist in the database
+                result = await self.database.fetch_all(
+                    SELECT_EXISTING_TICKERS_SQL, {"tickers": list(tickers)}
+                )
+                all_tickers = [row['ticker'] for row in result]
+                
+                # Check if any requested tickers don't exist
+                # One set plus a membership sweep instead of two throwaway sets
+                found = set(all_tickers)
+                missing_tickers = [t for t in tickers if t not in found]
+                if missing_tickers:
+                    logger.warning("Tickers not found in database: %s", missing_tickers)
+            else:
+                # Otherwise get all active tickers
+                all_tickers = await self.get_active_tickers()
+            
+            # Apply max_tickers limit if specified
+            if max_tickers and len(all_tickers) > max_tickers:
+                selected_tickers = all_tickers[:max_tickers]
+            else:
+                selected_tickers = all_tickers
+                
+            logger.info(f"Updating historical prices for {len(selected_tickers)} securities ({days} days)")
+            
+            # Calculate date range
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=days)
+            
+            # Track statistics
+            update_count = 0
+            unavailable_count = 0
+            price_points_added = 0
+            sources_used = set()
+            # SoA columns for the per-ticker summary: parallel lists are far
+            # cheaper to build and serialize than one dict per ticker
+            history_tickers = []
+            history_points = []
+            updated_tickers = set()
+
+            # Process tickers in batches
+            for i in range(0, len(selected_tickers), batch_size):
+                batch_tickers = selected_tickers[i:i+batch_size]
+                logger.info(f"Processing batch {i//batch_size + 1}/{(len(selected_tickers) + batch_size - 1)//batch_size}: {batch_tickers}")
+
+                try:
+                    history_rows = []
+                    backfilled_tickers = []
+
+                    # One vectorized call: the manager prefers sources with a
+                    # true batch endpoint and falls back to per-ticker lookups
+                    # itself, so the two code paths that used to live here are
+                    # one
+                    batch_results = await self.market_data.get_batch_historical_prices(
+                        batch_tickers, start_date, end_date
+                    )
+
+                    # One clock read per batch for the timestamp fallback
+                    batch_now = datetime.utcnow()
+
+                    # Tickers absent from the results failed on every source
+                    for ticker in batch_tickers:
+                        if not batch_results.get(ticker):
+                            logger.warning("No historical data available for %s in batch", ticker)
+                            unavailable_count += 1
+
+                    # Process each ticker's results from the batch
+                    for ticker, ticker_data in batch_results.items():
+                        if not ticker_data:
+                            continue
+
+                        ticker_points = 0
+                        # Collect rows for the batch-level upsert
+                        for point in ticker_data:
+                            # Validate up front; a malformed point is
+                            # dropped rather than poisoning the batch
+                            if point.get("close_price") is None or point.get("date") is None:
+                                continue
+                            source = point.get("source", "unknown")
+                            sources_used.add(source)
+                            history_rows.append({
+                                "ticker": ticker,
+                                "close_price": point.get("close_price"),
+                                "day_open": point.get("day_open"),
+                                "day_high": point.get("day_high"),
+                                "day_low": point.get("day_low"),
+                                "volume": point.get("volume"),
+                                "timestamp": point.get("timestamp") or batch_now,
+                                "date": point.get("date"),
+                                "source": source
+                            })
+                            price_points_added += 1
+                            ticker_points += 1
+
+                        # Store summary columns for this ticker
+                        history_tickers.append(ticker)
+                        history_points.append(ticker_points)
+
+                        backfilled_tickers.append(ticker)
+                        updated_tickers.add(ticker)
+                        update_count += 1
+
+                    # Flush the whole batch in two round trips and one commit:
+                    # one upsert for all price points, one UPDATE for the
+                    # backfill timestamps
+                    if history_rows or backfilled_tickers:
+                        try:
+                            async with self.database.transaction():
+                                if history_rows:
+                                    await self.database.execute_many(UPSERT_PRICE_HISTORY_SQL, history_rows)
+
+                                if backfilled_tickers:
+                                    await self.database.execute(
+                                        UPDATE_LAST_BACKFILLED_SQL,
+                                        {
+                                            "tickers": backfilled_tickers,
+                                            "timestamp": datetime.utcnow()
+                                        }
+                                    )
+                        except Exception as flush_error:
+                            # Retry row by row so only genuinely bad rows are lost
+                            logger.error("Bulk history flush failed, retrying row by row: %s", flush_error)
+                            row_errors = 0
+                            for row in history_rows:
+                                try:
+                                    await self.database.execute(UPSERT_PRICE_HISTORY_SQL, row)
+                                except Exception as row_error:
+                                    row_errors += 1
+                                    if row_errors <= ROW_ERROR_LOG_LIMIT:
+                                        logger.error("Error adding historical price for %s on %s: %s", row["ticker"], row["date"], row_error)
+                            if row_errors > ROW_ERROR_LOG_LIMIT:
+                                logger.error("Suppressed %d further history row errors in this batch", row_errors - ROW_ERROR_LOG_LIMIT)
+
+                except Exception as batch_error:
+                    logger.error(f"Error processing batch: {str(batch_error)}")
+                    # Continue with the next batch
+                
+                # Small delay between batches to avoid rate limiting
+                await asyncio.sleep(1)
+            
+            # Calculate duration
+            duration = time.perf_counter() - start_time
+            
+            # Record completion
+            result = {
+                "total_tickers": len(selected_tickers),
+                "updated_count": update_count,
+                "unavailable_count": unavailable_count,
+                "price_points_added": price_points_added,
+                "sources_used": list(sources_used),
+                "history_updates": {
+                    "tickers": history_tickers,
+                    "points_added": history_points,
+                    "date_range": {
+                        "start": start_date.isoformat(),
+                        "end": end_date.isoformat()
+                    }
+                },
+                "duration_seconds": duration
+            }
+
+            # Keep the audit payload to counts - per-ticker history detail can
+            # run to thousands of entries and only matters to the caller
+            self._record_completion(
+                event_id, {k: v for k, v in result.items() if k != "history_updates"}
+            )
+            
+            # After successful update, invalidate relevant caches
+            if FastCache.is_available() and updated_tickers:
+                # Invalidate security history caches with a single SCAN sweep
+                # instead of one round-trip per ticker
+                FastCache.delete_pattern("security_history:*")
+
+                logger.info(f"Invalidated historical data cache for {len(updated_tickers)} securities")
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error updating historical prices: {str(e)}")
+            
+            # Record failure
+            if event_id:
+                await update_system_event(
+                    self.database,
+                    event_id,
+                    "failed",
+                    {"error": str(e)},
+                    str(e)
+                )
+            
+            raise
+
+    async def smart_update(self, update_type="all", max_tickers=None) -> Dict[str, Any]:
+            """
+            Perform a smart update of security data based on what needs updating most
+            
+            Args:
+                update_type: Type of update to perform (all, prices, metrics, history)
+                max_tickers: Maximum number of tickers to update per operation
+                
+            Returns:
+                Summary of updates made
+            """
+            try:
+                await self.connect()
+                
+                start_time = time.perf_counter()
+                
+                # Record the start of this operation
+                event_id = await record_system_event(
+                    self.database, 
+                    "smart_update", 
+                    "started", 
+                    {"update_type": update_type, "max_tickers": max_tickers}
+                )
+                
+                results = {}
+
+                # Coroutines for the sub-updates we decide to run; launched
+                # together below so wall clock is the slowest operation rather
+                # than the sum of all three
+                tasks = {}
+
+                # Find the most urgent tickers for every requested update kind
+                # in one round-trip: each CTE does its own ordered LIMIT scan
+                # and a kind tag tells us which list the row belongs to. A
+                # LIMIT of 0 skips kinds that weren't requested.
+                candidate_rows = await self.database.fetch_all(
+                    SMART_UPDATE_CANDIDATES_SQL,
+                    {
+                        # Fewer tickers for metrics/history as they're slower
+                        "price_limit": (max_tickers or 100) if update_type in ["all", "prices"] else 0,
+                        "metrics_limit": (max_tickers or 50) if update_type in ["all", "metrics"] else 0,
+                        "history_limit": (max_tickers or 20) if update_type in ["all", "history"] else 0
+                    }
+                )
+
+                candidates = {"prices": [], "metrics": [], "history": []}
+                for row in candidate_rows:
+                    candidates[row["kind"]].append(row["ticker"])
+
+                # Skip tickers submitted within the cooldown window - smart
+                # updates fired in quick succession would otherwise re-pick the
+                # same oldest tickers while their writes are still in flight
+                now_monotonic = time.monotonic()
+                cooldown_cutoff = now_monotonic - SMART_UPDATE_COOLDOWN_SECONDS
+                for kind in candidates:
+                    fresh = [
+                        ticker for ticker in candidates[kind]
+                        if self._recently_submitted.get(ticker, 0.0) <= cooldown_cutoff
+                    ]
+                    skipped = len(candidates[kind]) - len(fresh)
+                    if skipped:
+                        logger.info(f"Smart update: skipping {skipped} {kind} tickers still in cooldown")
+                    candidates[kind] = fresh
+                    for ticker in fresh:
+                        self._recently_submitted[ticker] = now_monotonic
+
+                # Keep the cooldown map bounded
+                if len(self._recently_submitted) > RECENT_TICKERS_MAX:
+                    self._recently_submitted = {
+                        ticker: submitted_at
+                        for ticker, submitted_at in self._recently_submitted.items()
+                        if submitted_at > cooldown_cutoff
+                    }
+
+                if candidates["prices"]:
+                    logger.info(f"Smart update: Updating prices for {len(candidates['prices'])} securities")
+                    tasks["prices"] = self.update_security_prices(
+                        tickers=candidates["prices"]
+                    )
+
+                if candidates["metrics"]:
+                    logger.info(f"Smart update: Updating metrics for {len(candidates['metrics'])} securities")
+                    tasks["metrics"] = self.update_company_metrics(
+                        tickers=candidates["metrics"]
+                    )
+
+                if candidates["history"]:
+                    logger.info(f"Smart update: Updating historical data for {len(candidates['history'])} securities")
+                    tasks["history"] = self.update_historical_prices(
+                        tickers=candidates["history"],
+                        days=30  # Default to 30 days of history
+                    )
+
+                # Run the sub-updates concurrently; they share the module-level
+                # connection pool, so none of them tears it down mid-flight
+                if tasks:
+                    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+                    for key, outcome in zip(tasks.keys(), outcomes):
+                        if isinstance(outcome, BaseException):
+                            logger.error(f"Smart update: {key} update failed: {outcome}")
+                            results[key] = {"error": str(outcome)}
+                        else:
+                            results[key] = outcome
+
+                # Calculate duration
+                duration = time.perf_counter() - start_time
+                
+                # Create summary result
+                summary = {
+                    "update_type": update_type,
+                    "duration_seconds": duration,
+                    "results": results
+                }
+                
+                # Compute overall statistics in single passes
+                total_updated = sum(r.get("updated_count", 0) for r in results.values())
+                total_unavailable = sum(r.get("unavailable_count", 0) for r in results.values())
+                all_sources_used = frozenset().union(*(r.get("sources_used", ()) for r in results.values())) if results else frozenset()
+
+                summary["total_updated"] = total_updated
+                summary["total_unavailable"] = total_unavailable
+                summary["all_sources_used"] = sorted(all_sources_used)
+
+                # Record completion, stripping per-ticker history detail from
+                # the nested sub-results to keep the audit row small
+                event_summary = dict(summary)
+                event_summary["results"] = {
+                    key: {k: v for k, v in value.items() if k != "history_updates"}
+                    for key, value in results.items()
+                    if isinstance(value, dict)
+                }
+                self._record_completion(event_id, event_summary)
+                
+                return summary
+                
+            except Exception as e:
+                logger.error(f"Error in smart update: {str(e)}")
+                
+                # Record failure
+                if event_id:
+                    await update_system_event(
+                        self.database,
+                        event_id,
+                        "failed",
+                        {"error": str(e)},
+                        str(e)
+                    )
+                
+                raise
+
+    async def update_stale_securities(self, metrics_days_threshold=7, price_days_threshold=1, max_metrics_tickers=50, max_prices_tickers=100) -> Dict[str, Any]:
+        """
+        Update securities prioritized by staleness of metrics and prices
+        """
+        try:
+            await self.connect()
+            
+            # Use a timezone-naive datetime for consistency
+            start_time = time.perf_counter()
+            
+            # Record the start of this operation
+            event_id = await record_system_event(
+                self.database, 
+                "stale_update", 
+                "started", 
+                {
+                    "metrics_days_threshold": metrics_days_threshold,
+                    "price_days_threshold": price_days_threshold,
+                    "max_metrics_tickers": max_metrics_tickers, 
+                    "max_prices_tickers": max_prices_tickers
+                }
+            )
+            
+            results = {}
+            
+            # Find tickers with stale metrics (older than metrics_days_threshold days)
+            metrics_tickers = await self.database.fetch_all(
+                STALE_METRICS_TICKERS_SQL,
+                {"days": metrics_days_threshold, "limit": max_metrics_tickers}
+            )
+
+            # Find tickers with stale prices (older than price_days_threshold days)
+            price_tickers = await self.database.fetch_all(
+                STALE_PRICE_TICKERS_SQL,
+                {"days": price_days_threshold, "limit": max_prices_tickers}
+            )
+            
+            # Update stale metrics
+            if metrics_tickers:
+                metrics_tickers_list = [row["ticker"] for row in metrics_tickers]
+                logger.info(f"Stale update: Updating metrics for {len(metrics_tickers_list)} securities (not updated in {metrics_days_threshold} days)")
+                results["metrics"] = await self.update_company_metrics(
+                    tickers=metrics_tickers_list
+                )
+            else:
+                logger.info(f"No stale metrics found (older than {metrics_days_threshold} days)")
+                results["metrics"] = {"updated_count": 0, "message": "No stale metrics found"}
+            
+            # Update stale prices
+            if price_tickers:
+                price_tickers_list = [row["ticker"] for row in price_tickers]
+                logger.info(f"Stale update: Updating prices for {len(price_tickers_list)} securities (not updated in {price_days_threshold} days)")
+                results["prices"] = await self.update_security_prices(
+                    tickers=price_tickers_list
+                )
+            else:
+                logger.info(f"No stale prices found (older than {price_days_threshold} days)")
+                results["prices"] = {"updated_count": 0, "message": "No stale prices found"}
+            
+            # Calculate duration
+            duration = time.perf_counter() - start_time
+            
+            # Create summary result
+            summary = {
+                "metrics_days_threshold": metrics_days_threshold,
+                "price_days_threshold": price_days_threshold,
+                "duration_seconds": duration,
+                "metrics_count": len(metrics_tickers) if metrics_tickers else 0,
+                "prices_count": len(price_tickers) if price_tickers else 0,
+                "results": results
+            }
+            
+            # Record completion
+            self._record_completion(event_id, summary)
+            
+            return summary
+            
+        except Exception as e:
+            logger.error(f"Error in stale update: {str(e)}")
+            
+            # Record failure
+            if 'event_id' in locals() and event_id:
+                await update_system_event(
+                    self.database,
+                    event_id,
+                    "failed",
+                    {"error": str(e)},
+                    str(e)
+                )
+            
+            raise
+
+
+# Standalone execution function
+async def run_price_update(update_type: str = "prices", max_tickers: int = None, tickers_list: List[str] = None, days: int = 30):
+    updater = PriceUpdaterV2()
+
+    async def run_all():
+        # One ticker snapshot shared by all three workloads, then run them
+        # concurrently against the shared pool so their network I/O overlaps
+        await updater.connect()
+        tickers = list(tickers_list) if tickers_list else await updater.get_active_tickers()
+
+        outcomes = await asyncio.gather(
+            updater.update_security_prices(tickers=tickers, max_tickers=max_tickers),
+            updater.update_company_metrics(tickers=tickers, max_tickers=max_tickers),
+            updater.update_historical_prices(tickers=tickers, max_tickers=max_tickers, days=days),
+            return_exceptions=True
+        )
+
+        results = {}
+        for key, outcome in zip(("prices", "metrics", "history"), outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error("Full update: %s update failed: %s", key, outcome)
+                results[key] = {"error": str(outcome)}
+            else:
+                results[key] = outcome
+
+        return {
+            "results": results,
+            "total_updated": sum(r.get("updated_count", 0) for r in results.values()),
+            "total_unavailable": sum(r.get("unavailable_count", 0) for r in results.values()),
+            "all_sources_used": sorted(frozenset().union(
+                *(r.get("sources_used", ()) for r in results.values())
+            )),
+            "duration_seconds": max(
+                (r.get("duration_seconds", 0.0) for r in results.values()), default=0.0
+            ),
+        }
+
+    # Dispatch table instead of an if/elif chain; each entry is a coroutine
+    # factory so nothing runs until the type is selected, and new update
+    # types only need a new entry
+    handlers = {
+        "all": run_all,
+        "prices": lambda: updater.update_security_prices(tickers=tickers_list, max_tickers=max_tickers),
+        "metrics": lambda: updater.update_company_metrics(tickers=tickers_list, max_tickers=max_tickers),
+        "history": lambda: updater.update_historical_prices(tickers=tickers_list, max_tickers=max_tickers, days=days),
+        "smart": lambda: updater.smart_update(update_type="all", max_tickers=max_tickers),
+        "stale": lambda: updater.update_stale_securities(
+            metrics_days_threshold=7,
+            price_days_threshold=1,
+            max_metrics_tickers=max_tickers or 50,
+            max_prices_tickers=max_tickers or 100
+        )
+    }
+
+    try:
+        handler = handlers.get(update_type)
+        if handler is None:
+            logger.error("Unknown update type: %s", update_type)
+            sys.exit(2)
+
+        result = await handler()
+        # %-style args keep the formatting lazy: the result dict is only
+        # rendered when INFO is actually emitted
+        logger.info(
+            "%s update complete: updated=%s unavailable=%s sources=%s duration=%.2fs",
+            update_type,
+            result.get("total_updated", result.get("updated_count", 0)),
+            result.get("total_unavailable", result.get("unavailable_tickers_count", 0)),
+            result.get("all_sources_used", result.get("sources_used", [])),
+            result.get("duration_seconds", 0.0),
+        )
+
+    except Exception:
+        # Exit non-zero so cron/systemd see the failure instead of a silent
+        # data gap; SystemExit passes through asyncio.run after the finally
+        logger.exception("Update failed")
+        sys.exit(2)
+    finally:
+        # The individual update methods leave the shared pool connected so
+        # they can run concurrently; the entry point owns the teardown
+        await updater.disconnect()
+
+def _parse_tickers(value: str) -> tuple:
+    """argparse type for --tickers: comma-separated symbols to an upper-cased tuple"""
+    return tuple(ticker.strip().upper() for ticker in value.split(",") if ticker.strip())
+
+
+# Update argument parser
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="NestEgg Market Data Updater")
+    parser.add_argument("--type", choices=["prices", "metrics", "history", "smart", "stale", "all"], default="smart", help="Type of update to perform")
+    parser.add_argument("--max", type=int, help="Maximum number of tickers to process")
+    parser.add_argument("--tickers", type=_parse_tickers, default=(), help="Comma-separated list of tickers to update")
+    parser.add_argument("--days", type=int, default=30, help="Number of days of history to fetch (for history updates)")
+    parser.add_argument("--metrics-days", type=int, default=7, help="Days threshold for stale metrics")
+    parser.add_argument("--price-days", type=int, default=1, help="Days threshold for stale prices")
+    parser.add_argument("--batch-size", type=int, default=5, help="Batch size for API calls (for batched operations)")
+    parser.add_argument("--daemon", action="store_true", help="Keep running, performing a smart update every --interval seconds")
+    parser.add_argument("--interval", type=int, default=300, help="Seconds between update runs in daemon mode")
+
+    args = parser.parse_args()
+
+    # Normalized by argparse via _parse_tickers; empty tuple when not given
+    tickers_list = args.tickers
+
+    if args.daemon:
+        asyncio.run(PriceUpdaterV2().serve(
+            interval_seconds=args.interval,
+            max_tickers=args.max
+        ))
+    # Pass the days parameter when calling run_price_update
+    elif args.type == "history":
+        asyncio.run(run_price_update(args.type, args.max, tickers_list, days=args.days))
+    elif args.type == "stale":
+        # Special case for stale updates
+        async def run_stale_update():
+            updater = PriceUpdaterV2()
+            try:
+                await updater.update_stale_securities(
+                    metrics_days_threshold=args.metrics_days,
+                    price_days_threshold=args.price_days,
+                    max_metrics_tickers=args.max or 50,
+                    max_prices_tickers=args.max or 100
+                )
+            finally:
+                await updater.disconnect()
+
+        asyncio.run(run_stale_update())
+    else:
         asyncio.run(run_price_update(args.type, args.max, tickers_list))
\ No newline at end of file
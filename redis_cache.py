@@ -175,26 +175,153 @@ class RedisCache:
             logger.error(f"Error deleting from cache ({key}): {str(e)}")
             return False
     
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Get multiple values from the cache in a single round-trip
+
+        Args:
+            keys: List of cache keys
+
+        Returns:
+            Dictionary of key -> value for the keys that were found
+        """
+        if not keys:
+            return {}
+
+        if not self.is_available():
+            return {}
+
+        try:
+            values = self.client.mget([f"nestegg:{key}" for key in keys])
+            results = {}
+            for key, value in zip(keys, values):
+                if value is None:
+                    continue
+                try:
+                    results[key] = pickle.loads(value)
+                except Exception:
+                    try:
+                        results[key] = json.loads(value)
+                    except Exception:
+                        results[key] = value
+            return results
+        except Exception as e:
+            logger.error(f"Error getting {len(keys)} keys from cache: {str(e)}")
+            return {}
+
+    def set_many(self, mapping: Dict[str, Any], expire_seconds: int = 300) -> bool:
+        """
+        Set multiple values in the cache in a single round-trip
+
+        Args:
+            mapping: Dictionary of key -> value to cache
+            expire_seconds: Time-to-live in seconds (default: 5 minutes)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not mapping:
+            return True
+
+        if not self.is_available():
+            return False
+
+        try:
+            # One SET per key on a non-transactional pipeline so the whole
+            # batch costs one round-trip while keeping per-key TTLs
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                if isinstance(value, (dict, list, tuple, set, bool, int, float, str)) or value is None:
+                    serialized = json.dumps(value).encode('utf-8')
+                else:
+                    serialized = pickle.dumps(value)
+                pipe.set(f"nestegg:{key}", serialized, ex=expire_seconds)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error setting {len(mapping)} keys in cache: {str(e)}")
+            return False
+
+    def incr(self, key: str) -> Optional[int]:
+        """
+        Atomically increment an integer key, creating it at 1
+
+        Used for versioned cache namespaces: bumping the version orphans all
+        keys built with the old one (they TTL out), which invalidates a whole
+        namespace in one constant-time round-trip instead of a SCAN.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The new counter value, or None if unavailable
+        """
+        if not self.is_available():
+            return None
+
+        try:
+            return self.client.incr(f"nestegg:{key}")
+        except Exception as e:
+            logger.error(f"Error incrementing cache key ({key}): {str(e)}")
+            return None
+
+    def delete_many(self, keys: List[str]) -> bool:
+        """
+        Delete multiple keys in a single round-trip
+
+        Args:
+            keys: List of cache keys to delete
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not keys:
+            return True
+
+        if not self.is_available():
+            return False
+
+        try:
+            # Queue one UNLINK per key on a non-transactional pipeline so the
+            # whole batch costs one round-trip; UNLINK reclaims memory off the
+            # Redis main thread
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.unlink(f"nestegg:{key}")
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting {len(keys)} keys from cache: {str(e)}")
+            return False
+
     def delete_pattern(self, pattern: str) -> bool:
         """
         Delete all keys matching a pattern
-        
+
         Args:
             pattern: Pattern to match (e.g., "user:*")
-            
+
         Returns:
             True if successful, False otherwise
         """
         if not self.is_available():
             return False
-        
+
         try:
-            # Prefix pattern with 'nestegg:' to avoid collisions
+            # Prefix pattern with 'nestegg:' to avoid collisions.
+            # SCAN instead of KEYS so we never block the Redis main thread,
+            # unlinking matches in pipelined batches.
             prefixed_pattern = f"nestegg:{pattern}"
-            keys = self.client.keys(prefixed_pattern)
-            
-            if keys:
-                self.client.delete(*keys)
+            pipe = self.client.pipeline(transaction=False)
+            batched = 0
+            for key in self.client.scan_iter(match=prefixed_pattern, count=500):
+                pipe.unlink(key)
+                batched += 1
+                if batched >= 500:
+                    pipe.execute()
+                    batched = 0
+            if batched:
+                pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Error deleting pattern from cache ({pattern}): {str(e)}")
@@ -296,7 +423,32 @@ class FastCache:
     def delete(key: str) -> bool:
         """Delete value from cache"""
         return RedisCache.get_instance().delete(key)
-    
+
+    @staticmethod
+    def get_many(keys: List[str]) -> Dict[str, Any]:
+        """Get multiple values from cache in one round-trip"""
+        return RedisCache.get_instance().get_many(keys)
+
+    @staticmethod
+    def set_many(mapping: Dict[str, Any], expire_seconds: int = 300) -> bool:
+        """Set multiple values in cache in one round-trip"""
+        return RedisCache.get_instance().set_many(mapping, expire_seconds)
+
+    @staticmethod
+    def incr(key: str) -> Optional[int]:
+        """Atomically increment an integer key, creating it at 1"""
+        return RedisCache.get_instance().incr(key)
+
+    @staticmethod
+    def delete_many(keys: List[str]) -> bool:
+        """Delete multiple values from cache in one round-trip"""
+        return RedisCache.get_instance().delete_many(keys)
+
+    @staticmethod
+    def delete_pattern(pattern: str) -> bool:
+        """Delete all values matching a pattern"""
+        return RedisCache.get_instance().delete_pattern(pattern)
+
     @staticmethod
     def is_available() -> bool:
         """Check if cache is available"""
@@ -1,689 +1,789 @@
-"""
-Yahoo Finance market data source implementation.
-Uses the yfinance library for data access.
-"""
-import os
-import logging
-import asyncio
-import aiohttp
-import pandas as pd
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-import pytz
-import yfinance as yf
-
-from .data_source_interface import MarketDataSource
-
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("yahoo_finance_client")
-
-class YahooFinanceClient(MarketDataSource):
-    """
-    Client for interacting with Yahoo Finance API.
-    Uses the yfinance library for data access.
-    """
-    
-    def __init__(self):
-        """Initialize the Yahoo Finance client"""
-        # No API key needed
-        pass
-    
-    @property
-    def source_name(self) -> str:
-        """Return the name of this data source"""
-        return "yahoo_finance"
-        
-    @property
-    def daily_call_limit(self) -> Optional[int]:
-        """Return the daily API call limit (None if unlimited)"""
-        return None  # Yahoo Finance has no formal API limits
-    
-    async def get_current_price(self, ticker: str) -> Optional[Dict[str, Any]]:
-        """
-        Get current price for a single ticker
-        """
-        try:
-            # Fetch ticker data
-            ticker_obj = yf.Ticker(ticker)
-            
-            # Get historical data
-            history = ticker_obj.history(period="1d")
-            
-            # Add detailed logging
-           # logger.info(f"Raw data from yfinance for single ticker {ticker}:")
-           # logger.info(f"Data shape: {history.shape}")
-           # logger.info(f"Data columns: {history.columns}")
-           # logger.info(f"Data types: {history.dtypes}")
-            
-            if history.empty:
-                logger.warning(f"No price data available for {ticker}")
-                return None
-            
-            # Get the latest price
-            latest = history.iloc[-1]
-            
-            # Log all values from the latest row
-           # logger.info(f"Latest data row for {ticker}: {latest}")
-           # logger.info(f"Close: {latest.get('Close', 'N/A') if 'Close' in latest else 'Column not found'}")
-           # logger.info(f"Open: {latest.get('Open', 'N/A') if 'Open' in latest else 'Column not found'}")
-           # logger.info(f"High: {latest.get('High', 'N/A') if 'High' in latest else 'Column not found'}")
-           # logger.info(f"Low: {latest.get('Low', 'N/A') if 'Low' in latest else 'Column not found'}")
-           # logger.info(f"Volume: {latest.get('Volume', 'N/A') if 'Volume' in latest else 'Column not found'}")
-            
-            # Extract the actual date from the index
-            price_date = history.index[-1]
-            logger.info(f"Price date from index: {price_date}")
-            
-            # Create the return data
-            result = {
-                "price": float(latest['Close']),
-                "day_open": float(latest['Open']) if 'Open' in latest else None,
-                "day_high": float(latest['High']) if 'High' in latest else None,
-                "day_low": float(latest['Low']) if 'Low' in latest else None,
-                "close_price": float(latest['Close']),
-                "volume": int(latest['Volume']) if 'Volume' in latest else None,
-                "timestamp": datetime.now(),
-                "price_timestamp": price_date,
-                "price_timestamp_str": price_date.strftime("%Y-%m-%d %H:%M:%S"),
-                "source": self.source_name
-            }
-            
-            # Log the final result dict being returned
-            logger.info(f"Returning data for {ticker}: {result}")
-            
-            return result
-        
-        except Exception as e:
-            logger.error(f"Error getting price for {ticker}: {str(e)}")
-            return None
-    
-    async def get_batch_prices(self, tickers: List[str], max_batch_size: int = 100) -> Dict[str, Dict[str, Any]]:
-        """
-        Get current prices for multiple tickers
-        
-        Args:
-            tickers: List of ticker symbols
-            max_batch_size: Maximum batch size for a single request
-            
-        Returns:
-            Dictionary mapping tickers to their price data
-        """
-        logger.info(f"Starting batch request for: {tickers}")
-
-        if not tickers:
-            return {}
-            
-        results = {}
-        
-        # Process in batches to avoid overloading
-        for i in range(0, len(tickers), max_batch_size):
-            batch = tickers[i:i+max_batch_size]
-            batch_str = " ".join(batch)
-            
-            try:
-                # Use a separate thread for the yfinance API call
-                loop = asyncio.get_event_loop()
-                
-                # Download data for the batch
-                logger.info(f"Requesting data for: {batch_str}")
-                data = await loop.run_in_executor(
-                    None,
-                    lambda: yf.download(batch_str, period="1d", group_by="ticker")
-                )
-                
-              #  logger.info(f"Received data type: {type(data)}")
-              #  logger.info(f"Data is empty: {data.empty if hasattr(data, 'empty') else 'N/A'}")
-              #  logger.info(f"Data shape: {data.shape if hasattr(data, 'shape') else 'No shape'}")
-              #  logger.info(f"Data columns: {list(data.columns) if hasattr(data, 'columns') else 'No columns'}")
-                
-                # Process results
-                if len(batch) == 1:
-                    # Handle single ticker case where data is not grouped
-                    ticker = batch[0]
-                    logger.info(f"Processing single ticker: {ticker}")
-                    
-                    if not data.empty:
-                        try:
-                            latest = data.iloc[-1]
-                            price_date = data.index[-1]  # Get the actual date from Yahoo
-                            
-                            # Debug info
-                           # logger.info(f"Latest row for {ticker}: {latest}")
-                           # logger.info(f"Price date: {price_date}")
-                           # logger.info(f"Data columns: {data.columns}")
-                           # logger.info(f"Data types: {data.dtypes}")
-                            
-                            # Check if we have a multi-index DataFrame
-                            is_multi_index = isinstance(data.columns, pd.MultiIndex)
-                            
-                            # Log each OHLCV value specifically based on structure
-                            if is_multi_index:
-                                # Multi-index case - access with (ticker, field) pattern
-                                open_value = latest.get((ticker, 'Open'), 0)
-                                high_value = latest.get((ticker, 'High'), 0)
-                                low_value = latest.get((ticker, 'Low'), 0)
-                                close_price = latest.get((ticker, 'Close'), None)
-                                volume_value = latest.get((ticker, 'Volume'), 0)
-                                
-                               # logger.info(f"Multi-index Open value: {open_value}")
-                               # logger.info(f"Multi-index High value: {high_value}")
-                               # logger.info(f"Multi-index Low value: {low_value}")
-                               # logger.info(f"Multi-index Close value: {close_price}")
-                               # logger.info(f"Multi-index Volume value: {volume_value}")
-                            else:
-                                # Single-index case - direct access
-                                open_value = latest.get('Open', 0) if 'Open' in latest else 0
-                                high_value = latest.get('High', 0) if 'High' in latest else 0
-                                low_value = latest.get('Low', 0) if 'Low' in latest else 0
-                                close_price = latest.get('Close', None) if 'Close' in latest else None
-                                volume_value = latest.get('Volume', 0) if 'Volume' in latest else 0
-                                
-                              #  logger.info(f"Open value: {open_value}")
-                              #  logger.info(f"High value: {high_value}")
-                              #  logger.info(f"Low value: {low_value}")
-                              #  logger.info(f"Close value: {close_price}")
-                              #  logger.info(f"Volume value: {volume_value}")
-                            
-                            if close_price is not None:
-                                logger.info(f"Extracted values: Open={open_value}, High={high_value}, Low={low_value}, Close={close_price}, Volume={volume_value}")
-                                
-                                # Create result dictionary
-                                result_dict = {
-                                    "price": float(close_price),
-                                    "day_open": float(open_value),
-                                    "day_high": float(high_value),
-                                    "day_low": float(low_value),
-                                    "close_price": float(close_price),
-                                    "volume": int(volume_value) if volume_value else 0,
-                                    "timestamp": datetime.now(),
-                                    "price_timestamp": price_date,
-                                    "price_timestamp_str": price_date.strftime("%Y-%m-%d %H:%M:%S"),
-                                    "source": self.source_name
-                                }
-                                
-                                logger.info(f"Result dictionary for {ticker}: {result_dict}")
-                                results[ticker] = result_dict
-                        except Exception as e:
-                            logger.error(f"Error processing batch data for {ticker}: {str(e)}")
-                            import traceback
-                            logger.error(traceback.format_exc())
-                else:
-                    # Handle multi-ticker case where data is grouped by ticker
-                    logger.info(f"Processing multi-ticker batch: {batch}")
-                    
-                    # Log the structure of the multi-index dataframe
-                  #  logger.info(f"Column index levels: {data.columns.nlevels}")
-                  #  logger.info(f"Column index values: {[idx for idx in data.columns]}")
-                    
-                    for ticker in batch:
-                        if ticker in data and not data[ticker].empty:
-                            logger.info(f"Processing ticker in batch: {ticker}")
-                            
-                            ticker_data = data[ticker]
-                            latest = ticker_data.iloc[-1]
-                            price_date = ticker_data.index[-1]
-                            
-                            logger.info(f"Latest row for {ticker}: {latest}")
-                            logger.info(f"Data columns for {ticker}: {ticker_data.columns}")
-                            
-                            # Ensure Close is available
-                            if "Close" in latest:
-                                close_price = latest["Close"]
-                                logger.info(f"{ticker} Close: {close_price} (type: {type(close_price)})")
-                                
-                                # Handle the case where Close might be a Series
-                                if hasattr(close_price, "iloc"):
-                                    logger.info(f"{ticker} Close is a Series, accessing first element")
-                                    close_price = close_price.iloc[0]
-                                    logger.info(f"{ticker} Close after iloc: {close_price}")
-                                
-                                # Handle other price columns that might be Series
-                                open_price = latest["Open"]
-                                logger.info(f"{ticker} Open: {open_price} (type: {type(open_price)})")
-                                if hasattr(open_price, "iloc"):
-                                    open_price = open_price.iloc[0]
-                                    
-                                high_price = latest["High"]
-                                logger.info(f"{ticker} High: {high_price} (type: {type(high_price)})")
-                                if hasattr(high_price, "iloc"):
-                                    high_price = high_price.iloc[0]
-                                    
-                                low_price = latest["Low"]
-                                logger.info(f"{ticker} Low: {low_price} (type: {type(low_price)})")
-                                if hasattr(low_price, "iloc"):
-                                    low_price = low_price.iloc[0]
-                                    
-                                volume = latest["Volume"] if "Volume" in latest else None
-                                logger.info(f"{ticker} Volume: {volume} (type: {type(volume) if volume is not None else 'None'})")
-                                if hasattr(volume, "iloc"):
-                                    volume = volume.iloc[0]
-                                
-                                result_dict = {
-                                    "price": float(close_price),
-                                    "day_open": float(open_price),     
-                                    "day_high": float(high_price),      
-                                    "day_low": float(low_price),        
-                                    "close_price": float(close_price),
-                                    "volume": int(volume) if volume is not None else None,
-                                    "price_timestamp": price_date,
-                                    "price_timestamp_str": price_date.strftime("%Y-%m-%d %H:%M:%S"),
-                                    "source": self.source_name
-                                }
-                                
-                                logger.info(f"Result dictionary for {ticker}: {result_dict}")
-                                results[ticker] = result_dict
-                            else:
-                                logger.error(f"No Close column found for {ticker}")
-                
-                # Add a short delay to avoid rate limiting
-                await asyncio.sleep(0.5)
-                
-            except Exception as e:
-                logger.error(f"Error in batch lookup for {len(batch)} tickers: {str(e)}")
-                import traceback
-                logger.error(traceback.format_exc())
-                
-                logger.info(f"Data structure: {type(data) if 'data' in locals() else 'No data'}")
-                if 'data' in locals() and hasattr(data, 'shape'):
-                    logger.info(f"Data shape: {data.shape}")
-                if 'data' in locals() and hasattr(data, 'columns'):
-                    logger.info(f"Data columns: {list(data.columns)}")
-                
-                # If batch lookup fails, try individual lookups
-                for ticker in batch:
-                    try:
-                        logger.info(f"Attempting individual lookup for {ticker}")
-                        price_data = await self.get_current_price(ticker)
-                        if price_data:
-                            logger.info(f"Individual lookup successful for {ticker}: {price_data}")
-                            results[ticker] = price_data
-                        else:
-                            logger.warning(f"Individual lookup returned no data for {ticker}")
-                    except Exception as individual_error:
-                        logger.error(f"Error getting data for {ticker}: {str(individual_error)}")
-                        logger.error(traceback.format_exc())
-                    
-                    # Add a short delay between individual requests
-                    await asyncio.sleep(0.2)
-        
-        logger.info(f"Batch request complete, returning data for {len(results)} tickers")
-        return results
-    
-    async def get_company_metrics(self, ticker: str) -> Optional[Dict[str, Any]]:
-        """
-        Get company metrics for a ticker using the successful debugging approach
-        """
-        try:
-            # Fetch ticker data directly (synchronously)
-            ticker_obj = yf.Ticker(ticker)
-            
-            # Get company info
-            info = ticker_obj.info
-            
-            # Check if info is empty or minimal
-            if not info or len(info) <= 1:
-                logger.warning(f"Ticker {ticker} not found on Yahoo Finance")
-                return {"not_found": True, "source": self.source_name}
-            
-            # Comprehensive metrics extraction
-            metrics = {
-                # Core information
-                "company_name": info.get("shortName") or info.get("longName"),
-                "ticker": ticker,
-                "source": self.source_name,
-                
-                # Basic company details
-                "sector": info.get("sector"),
-                "industry": info.get("industry"),
-                
-                # Price and valuation metrics
-                "current_price": info.get("currentPrice"),
-                "previous_close": info.get("regularMarketPreviousClose"),
-                "market_cap": info.get("marketCap"),
-                
-                # Price range metrics
-                "day_open": info.get("regularMarketOpen"),
-                "day_low": info.get("regularMarketDayLow"),
-                "day_high": info.get("regularMarketDayHigh"),
-                
-                # Volume metrics
-                "volume": info.get("volume"),
-                "average_volume": info.get("averageVolume"),
-                
-                # Pricing metrics
-                "pe_ratio": info.get("trailingPE"),
-                "forward_pe": info.get("forwardPE"),
-                
-                # Dividend metrics
-                "dividend_rate": info.get("dividendRate"),
-                "dividend_yield": info.get("dividendYield"),
-                
-                # EPS metrics
-                "eps": info.get("trailingEPS"),
-                "forward_eps": info.get("forwardEPS"),
-                
-                # Price targets
-                "target_high_price": info.get("targetHighPrice"),
-                "target_low_price": info.get("targetLowPrice"),
-                "target_mean_price": info.get("targetMeanPrice"),
-                
-                # Additional metrics
-                "beta": info.get("beta"),
-                "fifty_two_week_low": info.get("fiftyTwoWeekLow"),
-                "fifty_two_week_high": info.get("fiftyTwoWeekHigh"),
-                "eps": info.get("trailingEPS"),
-                "forward_eps": info.get("forwardEPS"),
-                "fifty_two_week_range": info.get("fiftyTwoWeekRange"),
-                "target_median_price": info.get("targetMedianPrice"),
-                "bid_price": info.get("bid"),
-                "ask_price": info.get("ask"),
-            }
-            
-            # Remove None values to prevent database insertion issues
-            metrics = {k: v for k, v in metrics.items() if v is not None}
-            
-            logger.info(f"Metrics for {ticker}: {metrics}")
-            return metrics
-        
-        except Exception as e:
-            logger.error(f"Comprehensive error getting metrics for {ticker}: {str(e)}")
-            return None
-        
-    async def get_batch_historical_prices(self, tickers: List[str], start_date: datetime, end_date: Optional[datetime] = None, max_batch_size: int = 5) -> Dict[str, List[Dict[str, Any]]]:
-        """
-        Get historical prices for multiple tickers in batches
-        
-        Args:
-            tickers: List of ticker symbols
-            start_date: Start date for historical data
-            end_date: End date for historical data (defaults to today)
-            max_batch_size: Maximum number of tickers per batch (smaller is safer)
-            
-        Returns:
-            Dictionary mapping tickers to their historical price data lists
-        """
-        if not tickers:
-            return {}
-            
-        # Use current date if end_date not provided
-        if not end_date:
-            end_date = datetime.now()
-            
-        # Convert dates to strings in the format required by yfinance
-        start_str = start_date.strftime("%Y-%m-%d")
-        end_str = end_date.strftime("%Y-%m-%d")
-        
-        results = {}
-        
-        # Process in smaller batches to avoid overloading
-        for i in range(0, len(tickers), max_batch_size):
-            batch = tickers[i:i+max_batch_size]
-            batch_str = " ".join(batch)
-            
-            
-            try:
-                logger.info(f"Fetching historical data for batch: {batch_str}")
-                
-                # Use a separate thread for the yfinance API call
-                loop = asyncio.get_event_loop()
-                history = await loop.run_in_executor(
-                    None,
-                    lambda: yf.download(batch_str, start=start_str, end=end_str, group_by="ticker")
-                )
-                
-                # Check if we got any data
-                if hasattr(history, 'empty') and history.empty:
-                    logger.warning(f"No historical data available for batch: {batch_str}")
-                    continue
-                    
-                # If only one ticker, the data structure is different
-                if len(batch) == 1:
-                    ticker = batch[0]
-                    ticker_results = []
-                    
-                    # Process the data for this single ticker
-                    try:
-                        for date, row in history.iterrows():
-                            try:
-                                # Extract values safely using loc and handle potential Series objects
-                                # For Open column
-                                if 'Open' in row.index:
-                                    value = row.loc['Open']
-                                    # Handle if value is still a Series
-                                    if hasattr(value, 'iloc'):
-                                        value = value.iloc[0]
-                                    day_open = float(value) if not pd.isna(value) else None
-                                else:
-                                    day_open = None
-                                
-                                # For High column
-                                if 'High' in row.index:
-                                    value = row.loc['High']
-                                    if hasattr(value, 'iloc'):
-                                        value = value.iloc[0]
-                                    day_high = float(value) if not pd.isna(value) else None
-                                else:
-                                    day_high = None
-                                
-                                # For Low column
-                                if 'Low' in row.index:
-                                    value = row.loc['Low']
-                                    if hasattr(value, 'iloc'):
-                                        value = value.iloc[0]
-                                    day_low = float(value) if not pd.isna(value) else None
-                                else:
-                                    day_low = None
-                                
-                                # For Close column
-                                if 'Close' in row.index:
-                                    value = row.loc['Close']
-                                    if hasattr(value, 'iloc'):
-                                        value = value.iloc[0]
-                                    close_price = float(value) if not pd.isna(value) else None
-                                else:
-                                    close_price = None
-                                
-                                # For Volume column
-                                if 'Volume' in row.index:
-                                    value = row.loc['Volume']
-                                    if hasattr(value, 'iloc'):
-                                        value = value.iloc[0]
-                                    volume = int(value) if not pd.isna(value) else None
-                                else:
-                                    volume = None
-                                
-                                if close_price is not None:
-                                    ticker_results.append({
-                                        "date": date.date(),
-                                        "timestamp": date.to_pydatetime(),
-                                        "day_open": day_open,
-                                        "day_high": day_high,
-                                        "day_low": day_low,
-                                        "close_price": close_price,
-                                        "volume": volume,
-                                        "source": self.source_name
-                                    })
-                            except Exception as row_error:
-                                logger.warning(f"Error processing row for {ticker} on {date}: {str(row_error)}")
-                        
-                        results[ticker] = ticker_results
-                        logger.info(f"Processed {len(ticker_results)} historical points for {ticker}")
-                    except Exception as ticker_error:
-                        logger.error(f"Error processing historical data for {ticker}: {str(ticker_error)}")
-                else:
-                    # Multi-ticker case - data is grouped by ticker
-                    for ticker in batch:
-                        # Check if ticker data exists in the DataFrame
-                        if ticker in history.columns.levels[0]:
-                            ticker_data = history[ticker]
-                            ticker_results = []
-                            
-                            try:
-                                for date, row in ticker_data.iterrows():
-                                    try:
-                                        # Extract values safely
-                                        close_value = row['Close'] if 'Close' in row else None
-                                        # Handle if close_value is a Series
-                                        if hasattr(close_value, 'iloc') or hasattr(close_value, 'values'):
-                                            try:
-                                                close_value = close_value.iloc[0] if hasattr(close_value, 'iloc') else close_value.values[0]
-                                            except:
-                                                close_value = None
-                                        
-                                        # Only proceed if we have a valid close price
-                                        if close_value is not None and not pd.isna(close_value):
-                                            close_price = float(close_value)
-                                            
-                                            # Extract other values with the same approach
-                                            open_value = row['Open'] if 'Open' in row else None
-                                            if hasattr(open_value, 'iloc') or hasattr(open_value, 'values'):
-                                                open_value = open_value.iloc[0] if hasattr(open_value, 'iloc') else open_value.values[0]
-                                            day_open = float(open_value) if open_value is not None and not pd.isna(open_value) else None
-                                            
-                                            high_value = row['High'] if 'High' in row else None
-                                            if hasattr(high_value, 'iloc') or hasattr(high_value, 'values'):
-                                                high_value = high_value.iloc[0] if hasattr(high_value, 'iloc') else high_value.values[0]
-                                            day_high = float(high_value) if high_value is not None and not pd.isna(high_value) else None
-                                            
-                                            low_value = row['Low'] if 'Low' in row else None
-                                            if hasattr(low_value, 'iloc') or hasattr(low_value, 'values'):
-                                                low_value = low_value.iloc[0] if hasattr(low_value, 'iloc') else low_value.values[0]
-                                            day_low = float(low_value) if low_value is not None and not pd.isna(low_value) else None
-                                            
-                                            volume_value = row['Volume'] if 'Volume' in row else None
-                                            if hasattr(volume_value, 'iloc') or hasattr(volume_value, 'values'):
-                                                volume_value = volume_value.iloc[0] if hasattr(volume_value, 'iloc') else volume_value.values[0]
-                                            volume = int(volume_value) if volume_value is not None and not pd.isna(volume_value) else None
-                                            
-                                            ticker_results.append({
-                                                "date": date.date(),
-                                                "timestamp": date.to_pydatetime(),
-                                                "day_open": day_open,
-                                                "day_high": day_high,
-                                                "day_low": day_low,
-                                                "close_price": close_price,
-                                                "volume": volume,
-                                                "source": self.source_name
-                                            })
-                                    except Exception as row_error:
-                                        logger.warning(f"Error processing row for {ticker} on {date}: {str(row_error)}")
-                                
-                                if ticker_results:
-                                    results[ticker] = ticker_results
-                                    logger.info(f"Processed {len(ticker_results)} historical points for {ticker}")
-                                else:
-                                    logger.warning(f"No valid price data extracted for {ticker}")
-                            except Exception as ticker_error:
-                                logger.error(f"Error processing historical data for {ticker}: {str(ticker_error)}")
-                        else:
-                            logger.warning(f"No data returned for {ticker} in batch")
-                
-                # Add a short delay between batches
-                await asyncio.sleep(1)
-                
-            except Exception as batch_error:
-                logger.error(f"Error processing historical batch {batch_str}: {str(batch_error)}")
-                # Continue to the next batch
-        
-        return results
-        
-    async def get_historical_prices(self, ticker: str, start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
-        try:
-            # Use current date if end_date not provided
-            if not end_date:
-                end_date = datetime.now()
-                
-            # Convert dates to strings in the format required by yfinance
-            start_str = start_date.strftime("%Y-%m-%d")
-            end_str = end_date.strftime("%Y-%m-%d")
-            
-            # Use a separate thread for the yfinance API call
-            loop = asyncio.get_event_loop()
-            history = await loop.run_in_executor(
-                None,
-                lambda: yf.download(ticker, start=start_str, end=end_str)
-            )
-            
-            # Explicitly check if the DataFrame is empty using the .empty attribute
-            if hasattr(history, 'empty') and history.empty:
-                logger.warning(f"No historical data available for {ticker} from {start_str} to {end_str}")
-                return []
-            
-            # Convert to list of dictionaries
-            results = []
-            
-            # Use a safer iterrows approach which avoids Series ambiguity issues
-            for date, row in history.iterrows():
-                try:
-                    # Process each column individually to avoid Series ambiguity
-                    # Extract scalar values directly
-                    
-                    # For Open column
-                    if 'Open' in row.index:
-                        value = row.loc['Open']
-                        # Handle if value is still a Series (unlikely with iterrows but being safe)
-                        if hasattr(value, 'iloc'):
-                            value = value.iloc[0]
-                        day_open = float(value) if not pd.isna(value) else None
-                    else:
-                        day_open = None
-                    
-                    # For High column
-                    if 'High' in row.index:
-                        value = row.loc['High']
-                        if hasattr(value, 'iloc'):
-                            value = value.iloc[0]
-                        day_high = float(value) if not pd.isna(value) else None
-                    else:
-                        day_high = None
-                    
-                    # For Low column
-                    if 'Low' in row.index:
-                        value = row.loc['Low']
-                        if hasattr(value, 'iloc'):
-                            value = value.iloc[0]
-                        day_low = float(value) if not pd.isna(value) else None
-                    else:
-                        day_low = None
-                    
-                    # For Close column
-                    if 'Close' in row.index:
-                        value = row.loc['Close']
-                        if hasattr(value, 'iloc'):
-                            value = value.iloc[0]
-                        close_price = float(value) if not pd.isna(value) else None
-                    else:
-                        close_price = None
-                    
-                    # For Volume column
-                    if 'Volume' in row.index:
-                        value = row.loc['Volume']
-                        if hasattr(value, 'iloc'):
-                            value = value.iloc[0]
-                        volume = int(value) if not pd.isna(value) else None
-                    else:
-                        volume = None
-                    
-                    # Only add data points with valid prices
-                    if close_price is not None:
-                        results.append({
-                            "date": date.date(),
-                            "timestamp": date.to_pydatetime(),
-                            "day_open": day_open,
-                            "day_high": day_high,
-                            "day_low": day_low,
-                            "close_price": close_price,
-                            "volume": volume,
-                            "source": self.source_name
-                        })
-                except Exception as row_error:
-                    logger.warning(f"Error processing row for date {date} for {ticker}: {str(row_error)}")
-                    # Continue to next row
-            
-            if results:
-                logger.info(f"Successfully processed {len(results)} historical data points for {ticker}")
-            return results
-        except Exception as e:
-            logger.error(f"Error getting historical data for {ticker}: {str(e)}")
-            return []
\ No newline at end of file
+"""
+Yahoo Finance market data source implementation.
+Prices and history come straight from Yahoo's chart endpoint over a shared
+aiohttp session; the yfinance library remains only where Yahoo requires its
+cookie handling (company metrics).
+"""
+from __future__ import annotations
+
+import os
+import logging
+import asyncio
+import random
+import time
+import pandas as pd
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+import yfinance as yf
+import requests
+from requests.adapters import HTTPAdapter
+
+from .data_source_interface import MarketDataSource
+from .common import RateLimiter
+from redis_cache import FastCache
+
+# aiohttp is imported on first session use; it is a heavy import that CLIs
+# which never hit the Yahoo path shouldn't pay for at startup
+aiohttp = None
+
+def _ensure_aiohttp():
+    """Import aiohttp on first use and bind it at module level"""
+    global aiohttp
+    if aiohttp is None:
+        import aiohttp as _aiohttp
+        aiohttp = _aiohttp
+    return aiohttp
+
+# orjson decodes chart responses several times faster than the stdlib;
+# fall back to the stdlib loader if it isn't installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("yahoo_finance_client")
+
+# HTTP statuses worth retrying - rate limits and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Yahoo's chart endpoint serves quotes and daily bars without the
+# cookie/crumb dance its quote endpoints now require
+CHART_URL_TMPL = "https://query1.finance.yahoo.com/v8/finance/chart/{ticker}"
+
+# Yahoo rejects requests without a browser-looking user agent
+REQUEST_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Company metadata changes rarely; a long cache TTL spares the slow
+# yfinance .info fetch on repeat lookups
+METRICS_CACHE_SECONDS = 7 * 24 * 3600
+
+# Quotes are reused in-process for this long before re-fetching; callers
+# polling the same ticker inside the window share one HTTP request
+PRICE_CACHE_SECONDS = 60
+
+# Closed historical date ranges are immutable - cache their bars for a day
+HISTORY_CACHE_SECONDS = 24 * 3600
+
+def _fetch_ticker_info(ticker: str, session: requests.Session) -> Dict[str, Any]:
+    """Blocking .info fetch; runs on the client's thread pool"""
+    return yf.Ticker(ticker, session=session).info
+
+class YahooFinanceClient(MarketDataSource):
+    """
+    Client for interacting with Yahoo Finance.
+    Quotes and history use the chart API directly; metrics go through yfinance.
+    """
+
+    def __init__(self, total_conn_limit: int = 100, per_host_limit: int = 20,
+                 max_concurrency: int = 10):
+        """
+        Initialize the Yahoo Finance client
+
+        Args:
+            total_conn_limit: Maximum simultaneous connections for the shared session
+            per_host_limit: Maximum simultaneous connections per host
+            max_concurrency: Maximum in-flight chart requests for batch lookups,
+                overridable with the YAHOO_MAX_CONCURRENCY environment variable
+        """
+        # Bound once; hot paths read this instead of re-entering the property
+        self._source_name = "yahoo_finance"
+
+        # Shared HTTP session, created lazily so it binds to the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._total_conn_limit = total_conn_limit
+        self._per_host_limit = per_host_limit
+
+        # Maximum number of in-flight chart requests for batch lookups
+        self._max_concurrency = int(os.getenv("YAHOO_MAX_CONCURRENCY", str(max_concurrency)))
+
+        # Yahoo has no published quota, but sliding-window pacing keeps large
+        # runs a polite distance from its unadvertised throttling; it replaces
+        # the old fixed inter-batch sleeps, so fast responses aren't padded
+        self._rate_limiter = RateLimiter(
+            requests_per_period=int(os.getenv("YAHOO_REQUESTS_PER_SECOND", "10")),
+            period_seconds=1
+        )
+
+        # Short-lived in-process quote cache: ticker -> (expiry, price dict)
+        self._price_cache: Dict[str, tuple] = {}
+
+        # In-flight quote and metrics fetches by ticker; concurrent callers
+        # await the same task rather than issuing duplicate requests
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._metrics_inflight: Dict[str, asyncio.Task] = {}
+
+        # One pooled requests.Session for everything that still goes through
+        # yfinance; without it each Ticker/download call opens and discards
+        # its own connection to Yahoo
+        self._yf_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64)
+        self._yf_session.mount("https://", adapter)
+        self._yf_session.mount("http://", adapter)
+
+        # Dedicated pool for the yfinance calls that must run off the event
+        # loop; the default executor is shared process-wide and sized for
+        # CPU count, not for I/O-bound downloads
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("YF_MAX_WORKERS", "16")),
+            thread_name_prefix="yf"
+        )
+
+    @property
+    def source_name(self) -> str:
+        """Return the name of this data source"""
+        return self._source_name
+
+    @property
+    def daily_call_limit(self) -> Optional[int]:
+        """Return the daily API call limit (None if unlimited)"""
+        return None  # Yahoo Finance has no formal API limits
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared aiohttp session, creating it on first use.
+        Reusing one session keeps connections alive across calls instead of
+        paying a new TCP+TLS handshake per request.
+        """
+        if self._session is None or self._session.closed:
+            aiohttp = _ensure_aiohttp()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._total_conn_limit,
+                    limit_per_host=self._per_host_limit,
+                    ttl_dns_cache=300,
+                    # Hold idle sockets past Yahoo's keep-alive window so
+                    # bursts a minute apart still reuse warm connections
+                    keepalive_timeout=75,
+                    enable_cleanup_closed=True
+                ),
+                # The chart endpoint needs no cookies; skip jar bookkeeping
+                # on every request/response cycle
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=30, connect=10),
+                headers=REQUEST_HEADERS
+            )
+        return self._session
+
+    async def aclose(self) -> None:
+        """Close the shared session and thread pool; call at app shutdown"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._executor.shutdown(wait=False)
+
+    async def _get_json(self, url: str, params: Dict[str, Any], retries: int = 3) -> tuple:
+        """
+        Issue a GET request and return (status, parsed JSON body).
+
+        Transient failures (429/5xx, connection errors, timeouts) are retried
+        with exponential backoff plus jitter; a Retry-After header from the
+        server takes precedence over the computed delay. Non-retryable
+        statuses are returned to the caller with a None body.
+        """
+        session = await self._get_session()
+        delay = 1.0
+
+        for attempt in range(retries + 1):
+            try:
+                await self._rate_limiter.wait_if_needed()
+                async with session.get(url, params=params) as response:
+                    if response.status in RETRYABLE_STATUSES and attempt < retries:
+                        retry_after = response.headers.get("Retry-After")
+                        if retry_after:
+                            wait_time = float(retry_after)
+                        else:
+                            wait_time = delay + random.uniform(0, delay)
+                        logger.warning(f"Got status {response.status} from Yahoo, retrying in {wait_time:.1f}s (attempt {attempt + 1}/{retries + 1})")
+                        await asyncio.sleep(wait_time)
+                        delay = min(delay * 2, 30.0)
+                        continue
+
+                    if response.status >= 400:
+                        return response.status, None
+
+                    # Parse straight from the body bytes rather than via
+                    # response.json(), which decodes to an intermediate str
+                    # and is strict about Yahoo's content-type variants
+                    body = await response.read()
+                    return response.status, json_loads(body)
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt < retries:
+                    wait_time = delay + random.uniform(0, delay)
+                    logger.warning(f"Connection error from Yahoo: {str(e)}. Retrying in {wait_time:.1f}s (attempt {attempt + 1}/{retries + 1})")
+                    await asyncio.sleep(wait_time)
+                    delay = min(delay * 2, 30.0)
+                else:
+                    raise
+
+        return None, None
+
+    def _parse_chart_quote(self, ticker: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Convert a chart-endpoint response into the price dict shape the rest
+        of the app expects, or None when the payload has no usable price.
+        """
+        try:
+            result = (data.get("chart", {}).get("result") or [None])[0]
+            if not result:
+                return None
+
+            meta = result.get("meta", {})
+            price = meta.get("regularMarketPrice")
+
+            quote = (result.get("indicators", {}).get("quote") or [{}])[0]
+
+            def last_value(values):
+                """Most recent non-null entry of a chart array"""
+                if not values:
+                    return None
+                for value in reversed(values):
+                    if value is not None:
+                        return value
+                return None
+
+            close_price = last_value(quote.get("close"))
+            if price is None:
+                price = close_price
+            if price is None:
+                return None
+
+            market_time = meta.get("regularMarketTime")
+            price_timestamp = datetime.fromtimestamp(market_time) if market_time else None
+
+            volume = last_value(quote.get("volume"))
+            return {
+                "price": float(price),
+                "day_open": float(last_value(quote.get("open"))) if last_value(quote.get("open")) is not None else None,
+                "day_high": float(last_value(quote.get("high"))) if last_value(quote.get("high")) is not None else None,
+                "day_low": float(last_value(quote.get("low"))) if last_value(quote.get("low")) is not None else None,
+                "close_price": float(close_price) if close_price is not None else float(price),
+                "volume": int(volume) if volume is not None else None,
+                "timestamp": datetime.now(),
+                "price_timestamp": price_timestamp,
+                "price_timestamp_str": price_timestamp.strftime("%Y-%m-%d %H:%M:%S") if price_timestamp else None,
+                "source": self.source_name
+            }
+        except Exception as e:
+            logger.error(f"Error parsing chart payload for {ticker}: {str(e)}")
+            return None
+
+    async def get_current_price(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """
+        Get current price for a single ticker
+
+        One small JSON request against the chart endpoint - no yfinance
+        layer, no DataFrame, no thread hop. Results are reused in-process
+        for PRICE_CACHE_SECONDS so tight polling loops don't re-fetch, and
+        concurrent callers asking for the same ticker share one in-flight
+        request instead of issuing duplicates.
+        """
+        cached = self._price_cache.get(ticker)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        task = self._inflight.get(ticker)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_current_price(ticker))
+            self._inflight[ticker] = task
+            task.add_done_callback(lambda _t, _ticker=ticker: self._inflight.pop(_ticker, None))
+        return await task
+
+    async def _fetch_current_price(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """Uncached chart fetch behind get_current_price's dedup registry"""
+        try:
+            status, data = await self._get_json(
+                CHART_URL_TMPL.format(ticker=ticker),
+                {"range": "1d", "interval": "1d"}
+            )
+
+            if data is None:
+                logger.warning(f"No price data available for {ticker} (status {status})")
+                return None
+
+            result = self._parse_chart_quote(ticker, data)
+            if result is None:
+                logger.warning(f"No price data available for {ticker}")
+            else:
+                self._price_cache[ticker] = (time.monotonic() + PRICE_CACHE_SECONDS, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"Error getting price for {ticker}: {str(e)}")
+            return None
+
+    async def get_batch_prices(self, tickers: List[str], max_batch_size: int = 100) -> Dict[str, Dict[str, Any]]:
+        """
+        Get current prices for multiple tickers
+
+        The chart endpoint is per-symbol, so the batch is a bounded concurrent
+        fan-out over the shared session; connection reuse keeps the per-symbol
+        cost to one request on a warm socket.
+
+        Args:
+            tickers: List of ticker symbols
+            max_batch_size: Retained for interface compatibility; concurrency
+                is governed by the client's semaphore instead
+
+        Returns:
+            Dictionary mapping tickers to their price data
+        """
+        if not tickers:
+            return {}
+
+        logger.info(f"Starting batch price request for {len(tickers)} tickers")
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def fetch_one(ticker):
+            async with semaphore:
+                return ticker, await self.get_current_price(ticker)
+
+        fetched = await asyncio.gather(
+            *(fetch_one(ticker) for ticker in tickers),
+            return_exceptions=True
+        )
+
+        results = {}
+        for item in fetched:
+            if isinstance(item, BaseException):
+                logger.error(f"Error in batch price lookup: {str(item)}")
+                continue
+            ticker, price_data = item
+            if price_data:
+                results[ticker] = price_data
+
+        logger.info(f"Batch request complete, returning data for {len(results)} tickers")
+        return results
+    
+    async def get_company_metrics(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """
+        Get company metrics for a ticker using the successful debugging approach
+
+        Concurrent callers asking for the same ticker share one in-flight
+        fetch, mirroring the quote path's dedup registry.
+        """
+        task = self._metrics_inflight.get(ticker)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_company_metrics(ticker))
+            self._metrics_inflight[ticker] = task
+            task.add_done_callback(lambda _t, _ticker=ticker: self._metrics_inflight.pop(_ticker, None))
+        return await task
+
+    async def _fetch_company_metrics(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """Cache-then-network metrics fetch behind get_company_metrics' registry"""
+        try:
+            # Serve repeat queries from cache - the .info fetch behind this is
+            # one of the slowest calls the client makes
+            cache_key = f"yahoo:metrics:{ticker}"
+            if FastCache.is_available():
+                cached = FastCache.get(cache_key)
+                if cached:
+                    return cached
+
+            # The .info property does blocking network I/O (quoteSummary plus
+            # Yahoo's cookie/crumb handshake) - keep it off the event loop
+            await self._rate_limiter.wait_if_needed()
+            loop = asyncio.get_event_loop()
+            info = await loop.run_in_executor(self._executor, _fetch_ticker_info, ticker, self._yf_session)
+            
+            # Check if info is empty or minimal
+            if not info or len(info) <= 1:
+                logger.warning(f"Ticker {ticker} not found on Yahoo Finance")
+                return {"not_found": True, "source": self.source_name}
+            
+            # Comprehensive metrics extraction - bind the dict's get once
+            # instead of an attribute lookup per field
+            get = info.get
+            metrics = {
+                # Core information
+                "company_name": get("shortName") or get("longName"),
+                "ticker": ticker,
+                "source": self.source_name,
+
+                # Basic company details
+                "sector": get("sector"),
+                "industry": get("industry"),
+
+                # Price and valuation metrics
+                "current_price": get("currentPrice"),
+                "previous_close": get("regularMarketPreviousClose"),
+                "market_cap": get("marketCap"),
+
+                # Price range metrics
+                "day_open": get("regularMarketOpen"),
+                "day_low": get("regularMarketDayLow"),
+                "day_high": get("regularMarketDayHigh"),
+
+                # Volume metrics
+                "volume": get("volume"),
+                "average_volume": get("averageVolume"),
+
+                # Pricing metrics
+                "pe_ratio": get("trailingPE"),
+                "forward_pe": get("forwardPE"),
+
+                # Dividend metrics
+                "dividend_rate": get("dividendRate"),
+                "dividend_yield": get("dividendYield"),
+
+                # EPS metrics
+                "eps": get("trailingEPS"),
+                "forward_eps": get("forwardEPS"),
+
+                # Price targets
+                "target_high_price": get("targetHighPrice"),
+                "target_low_price": get("targetLowPrice"),
+                "target_mean_price": get("targetMeanPrice"),
+                "target_median_price": get("targetMedianPrice"),
+
+                # Additional metrics
+                "beta": get("beta"),
+                "fifty_two_week_low": get("fiftyTwoWeekLow"),
+                "fifty_two_week_high": get("fiftyTwoWeekHigh"),
+                "fifty_two_week_range": get("fiftyTwoWeekRange"),
+                "bid_price": get("bid"),
+                "ask_price": get("ask"),
+            }
+
+            # Remove None values to prevent database insertion issues
+            metrics = {k: v for k, v in metrics.items() if v is not None}
+
+            if FastCache.is_available():
+                FastCache.set(cache_key, metrics, METRICS_CACHE_SECONDS)
+
+            logger.debug("Metrics for %s: %s", ticker, metrics)
+            return metrics
+        
+        except Exception as e:
+            logger.error(f"Comprehensive error getting metrics for {ticker}: {str(e)}")
+            return None
+
+    async def get_batch_metrics(self, tickers: List[str], max_concurrent: int = 10) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Get company metrics for multiple tickers concurrently
+
+        Yahoo's multi-symbol quote endpoint sits behind the same cookie/crumb
+        auth as quoteSummary, so batching is a bounded fan-out over
+        get_company_metrics instead - each lookup still benefits from the
+        metrics cache and runs its yfinance call on the thread pool.
+
+        Args:
+            tickers: List of ticker symbols
+            max_concurrent: Maximum simultaneous lookups
+
+        Returns:
+            Dictionary mapping each ticker to its metrics dict (None on failure)
+        """
+        if not tickers:
+            return {}
+
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def fetch_one(ticker):
+            async with semaphore:
+                try:
+                    return ticker, await self.get_company_metrics(ticker)
+                except Exception as e:
+                    logger.error(f"Error getting metrics for {ticker}: {str(e)}")
+                    return ticker, None
+
+        return dict(await asyncio.gather(*(fetch_one(ticker) for ticker in tickers)))
+
+    def _frame_to_price_rows(self, frame: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Convert a yfinance OHLCV DataFrame into the row-dict list the rest of
+        the app expects.
+
+        Works column-wise: pull each OHLCV column out once as a plain Python
+        list and zip the lists into rows, instead of iterrows() with per-cell
+        presence and NaN checks - the difference is an order of magnitude on
+        multi-year frames.
+        """
+        if frame is None or frame.empty:
+            return []
+
+        # yf.download returns MultiIndex columns in some shapes; flatten to
+        # the plain OHLCV field names before extracting
+        if isinstance(frame.columns, pd.MultiIndex):
+            frame = frame.copy()
+            field_level = 0 if "Close" in frame.columns.get_level_values(0) else -1
+            frame.columns = frame.columns.get_level_values(field_level)
+
+        if "Close" not in frame.columns:
+            return []
+
+        # Rows without a close price are unusable; drop them up front so the
+        # remaining columns never need per-cell NaN handling for Close
+        frame = frame.dropna(subset=["Close"])
+        if frame.empty:
+            return []
+
+        def column(name, caster):
+            """One column as a list of cast scalars, None where missing/NaN"""
+            if name not in frame.columns:
+                return [None] * len(frame)
+            return [caster(v) if pd.notna(v) else None for v in frame[name].tolist()]
+
+        closes = [float(v) for v in frame["Close"].tolist()]
+        opens = column("Open", float)
+        highs = column("High", float)
+        lows = column("Low", float)
+        volumes = column("Volume", int)
+
+        source = self.source_name
+        rows = []
+        for ts, day_open, day_high, day_low, close_price, volume in zip(
+                frame.index, opens, highs, lows, closes, volumes):
+            timestamp = ts.to_pydatetime()
+            rows.append({
+                "date": timestamp.date(),
+                "timestamp": timestamp,
+                "day_open": day_open,
+                "day_high": day_high,
+                "day_low": day_low,
+                "close_price": close_price,
+                "volume": volume,
+                "source": source
+            })
+        return rows
+
+    async def get_batch_historical_prices(self, tickers: List[str], start_date: datetime, end_date: Optional[datetime] = None, max_batch_size: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get historical prices for multiple tickers in batches
+        
+        Args:
+            tickers: List of ticker symbols
+            start_date: Start date for historical data
+            end_date: End date for historical data (defaults to today)
+            max_batch_size: Maximum number of tickers per batch (smaller is safer)
+            
+        Returns:
+            Dictionary mapping tickers to their historical price data lists
+        """
+        if not tickers:
+            return {}
+            
+        # Use current date if end_date not provided
+        if not end_date:
+            end_date = datetime.now()
+            
+        # Convert dates to strings in the format required by yfinance
+        start_str = start_date.strftime("%Y-%m-%d")
+        end_str = end_date.strftime("%Y-%m-%d")
+        
+        batches = [tickers[i:i + max_batch_size] for i in range(0, len(tickers), max_batch_size)]
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        loop = asyncio.get_event_loop()
+        results = {}
+
+        async def fetch_batch(batch):
+            """Download one batch on the thread pool and extract its frames"""
+            # A one-ticker batch gains nothing from yf.download's grouped
+            # frame; the chart path is cheaper and gets the closed-range cache
+            if len(batch) == 1:
+                ticker = batch[0]
+                ticker_results = await self.get_historical_prices(ticker, start_date, end_date)
+                if ticker_results:
+                    results[ticker] = ticker_results
+                else:
+                    logger.warning(f"No valid price data extracted for {ticker}")
+                return
+
+            batch_str = " ".join(batch)
+            try:
+                logger.info(f"Fetching historical data for batch: {batch_str}")
+
+                async with semaphore:
+                    await self._rate_limiter.wait_if_needed()
+                    history = await loop.run_in_executor(
+                        self._executor,
+                        partial(yf.download, batch_str, start=start_str, end=end_str, group_by="ticker",
+                                session=self._yf_session, threads=False, progress=False)
+                    )
+
+                # Check if we got any data
+                if hasattr(history, 'empty') and history.empty:
+                    logger.warning(f"No historical data available for batch: {batch_str}")
+                    return
+
+                # Data is grouped by ticker; single-ticker batches never
+                # reach this path, so the frame shape is always MultiIndex
+                for ticker in batch:
+                    if ticker in history.columns.levels[0]:
+                        ticker_results = self._frame_to_price_rows(history[ticker])
+                        if ticker_results:
+                            results[ticker] = ticker_results
+                            logger.debug("Processed %d historical points for %s", len(ticker_results), ticker)
+                        else:
+                            logger.warning(f"No valid price data extracted for {ticker}")
+                    else:
+                        logger.warning(f"No data returned for {ticker} in batch")
+
+            except Exception as batch_error:
+                logger.error(f"Error processing historical batch {batch_str}: {str(batch_error)}")
+                # The other batches carry on
+
+        await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+
+        return results
+        
+    async def _fetch_chart_arrays(self, ticker: str, start_date: datetime, end_date: datetime) -> Optional[Dict[str, list]]:
+        """
+        Fetch a date range from the chart endpoint and return its parallel
+        arrays (timestamps plus one list per OHLCV field), or None when no
+        usable data came back. Missing fields are padded with None columns
+        so every array has the same length.
+
+        Ranges that end before today can never change, so those are served
+        from cache for a day; open-ended ranges always hit the network.
+        """
+        period1 = int(start_date.timestamp())
+        period2 = int(end_date.timestamp())
+
+        # Only a range that closed before today is safe to reuse - anything
+        # touching the current session would serve a stale close
+        closed_range = end_date.date() < datetime.now().date()
+        cache_key = f"yahoo:history:{ticker}:{period1}:{period2}"
+        if closed_range and FastCache.is_available():
+            cached = FastCache.get(cache_key)
+            if cached:
+                return cached
+
+        status, data = await self._get_json(
+            CHART_URL_TMPL.format(ticker=ticker),
+            {"period1": period1, "period2": period2, "interval": "1d"}
+        )
+
+        if data is None:
+            logger.warning(f"No historical data available for {ticker} (status {status})")
+            return None
+
+        result = (data.get("chart", {}).get("result") or [None])[0]
+        if not result:
+            logger.warning(f"No historical data available for {ticker}")
+            return None
+
+        timestamps = result.get("timestamp") or []
+        quote = (result.get("indicators", {}).get("quote") or [{}])[0]
+        if not timestamps or not quote.get("close"):
+            logger.warning(f"No historical data available for {ticker} from {start_date:%Y-%m-%d} to {end_date:%Y-%m-%d}")
+            return None
+
+        none_column = [None] * len(timestamps)
+        arrays = {
+            "timestamps": timestamps,
+            "open": quote.get("open") or none_column,
+            "high": quote.get("high") or none_column,
+            "low": quote.get("low") or none_column,
+            "close": quote.get("close"),
+            "volume": quote.get("volume") or none_column
+        }
+
+        if closed_range and FastCache.is_available():
+            FastCache.set(cache_key, arrays, HISTORY_CACHE_SECONDS)
+
+        return arrays
+
+    async def get_historical_prices(self, ticker: str, start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Get historical daily prices for a single ticker.
+
+        Goes straight to the chart endpoint, whose response is already
+        struct-of-arrays (one timestamp array plus one array per OHLCV
+        field), so rows fall out of a single zip - no yfinance download, no
+        DataFrame materialization, no thread hop.
+        """
+        try:
+            # Use current date if end_date not provided
+            if not end_date:
+                end_date = datetime.now()
+
+            arrays = await self._fetch_chart_arrays(ticker, start_date, end_date)
+            if arrays is None:
+                return []
+
+            source = self.source_name
+            results = []
+            for ts, day_open, day_high, day_low, close_price, volume in zip(
+                    arrays["timestamps"], arrays["open"], arrays["high"],
+                    arrays["low"], arrays["close"], arrays["volume"]):
+                # Holidays and halts come back as null entries - skip them
+                if close_price is None:
+                    continue
+                timestamp = datetime.fromtimestamp(ts)
+                results.append({
+                    "date": timestamp.date(),
+                    "timestamp": timestamp,
+                    "day_open": float(day_open) if day_open is not None else None,
+                    "day_high": float(day_high) if day_high is not None else None,
+                    "day_low": float(day_low) if day_low is not None else None,
+                    "close_price": float(close_price),
+                    "volume": int(volume) if volume is not None else None,
+                    "source": source
+                })
+
+            if results:
+                logger.debug("Processed %d historical data points for %s", len(results), ticker)
+            return results
+        except Exception as e:
+            logger.error(f"Error getting historical data for {ticker}: {str(e)}")
+            return []
+
+    async def get_historical_price_arrays(self, ticker: str, start_date: datetime, end_date: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Columnar variant of get_historical_prices for numeric consumers.
+
+        Returns float64/int64 numpy arrays keyed by field ("dates",
+        "day_open", "day_high", "day_low", "close_price", "volume") with
+        null entries dropped, avoiding the per-row dict materialization
+        entirely - a multi-year series becomes six contiguous arrays instead
+        of thousands of small dicts. Returns None when no data is available.
+        """
+        import numpy as np
+
+        try:
+            if not end_date:
+                end_date = datetime.now()
+
+            arrays = await self._fetch_chart_arrays(ticker, start_date, end_date)
+            if arrays is None:
+                return None
+
+            closes = np.array(arrays["close"], dtype=float)
+            valid = ~np.isnan(closes)
+
+            def column(values, dtype=float):
+                """None-safe conversion of one chart array, filtered to valid rows"""
+                return np.array([v if v is not None else np.nan for v in values], dtype=dtype)[valid]
+
+            timestamps = np.array(arrays["timestamps"], dtype="int64")[valid]
+            return {
+                "dates": timestamps.astype("datetime64[s]"),
+                "day_open": column(arrays["open"]),
+                "day_high": column(arrays["high"]),
+                "day_low": column(arrays["low"]),
+                "close_price": closes[valid],
+                "volume": column(arrays["volume"]),
+                "source": self.source_name
+            }
+        except Exception as e:
+            logger.error(f"Error getting historical data for {ticker}: {str(e)}")
+            return None
+
+
+# Module-level singleton: the client's value comes from its shared state
+# (session, caches, in-flight registry, thread pool), so everything in the
+# process should go through one instance
+_client: Optional[YahooFinanceClient] = None
+
+def get_yahoo_client() -> YahooFinanceClient:
+    """Return the process-wide YahooFinanceClient, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = YahooFinanceClient()
+    return _client